@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import functools
 import os
 import time
 from enum import Enum
@@ -15,8 +16,9 @@ class UserRole(str, Enum):
     UNKNOWN = "unknown"
 
 
-def parse_admin_ids() -> set[int]:
-    """Parse admin IDs from ADMIN_IDS/ADMIN_ID env vars."""
+@functools.lru_cache(maxsize=1)
+def parse_admin_ids() -> frozenset[int]:
+    """Parse admin IDs from ADMIN_IDS/ADMIN_ID env vars (cached after first call)."""
     ids: set[int] = set()
     for raw in os.getenv("ADMIN_IDS", "").split(","):
         raw = raw.strip()
@@ -25,7 +27,7 @@ def parse_admin_ids() -> set[int]:
     admin_id = os.getenv("ADMIN_ID", "").strip()
     if admin_id.isdigit():
         ids.add(int(admin_id))
-    return ids
+    return frozenset(ids)
 
 
 def now_ts() -> int:
@@ -2,22 +2,102 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
-from datetime import datetime, timezone
-from math import ceil
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import chain
 
-from aiogram import F, Router
+from aiogram import BaseMiddleware, F, Router
 from aiogram.exceptions import TelegramBadRequest
-from aiogram.filters import StateFilter
+from aiogram.filters import BaseFilter, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, Message, ReplyKeyboardMarkup
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, Message, MessageOriginUser, ReplyKeyboardMarkup
 
 from access_control import now_ts
 from storage_users import LIST_PAGE_SIZE, SECONDS_IN_DAY, UsersStorage
 
+_log = logging.getLogger(__name__)
+
 ADMIN_MENU_BTN = "👥 Управление пользователями"
 
+# callback_data prefixes shared by filter registrations below.
+ADD_DAYS_PREFIX = "add:days:"
+EDIT_PLUS_PREFIX = "edit:plus:"
+ACTIVE_PAGE_PREFIX = "active:page:"
+EXPIRING_PAGE_PREFIX = "expiring:page:"
+
+
+class IsAdmin(BaseFilter):
+    """Router-level guard: drops non-admin updates before handlers are scheduled.
+
+    Specializes on the (common) single-admin deployment: one int compare
+    instead of a hash-and-probe per update.
+    """
+
+    def __init__(self) -> None:
+        self._seen: frozenset[int] | None = None
+        self._single: int | None = None
+
+    async def __call__(self, event: Message | CallbackQuery, admin_ids: frozenset[int]) -> bool:
+        if event.from_user is None:
+            return False
+        if admin_ids is not self._seen:
+            self._seen = admin_ids
+            self._single = next(iter(admin_ids)) if len(admin_ids) == 1 else None
+        if self._single is not None:
+            return event.from_user.id == self._single
+        return event.from_user.id in admin_ids
+
+
+class PerChatConcurrencyMiddleware(BaseMiddleware):
+    """Detach admin-flow handling from the dispatcher loop.
+
+    Admin updates are processed in a background task serialized by a per-chat
+    lock: FSM ordering inside one admin dialog is preserved, while a slow
+    get_chat round trip no longer stalls unrelated user updates.
+    Non-admin events pass through untouched so the router filters can reject
+    them and propagation continues as usual.
+    """
+
+    def __init__(self) -> None:
+        self._locks: dict[int, asyncio.Lock] = {}
+        # Strong references keep in-flight tasks alive until done.
+        self._tasks: set[asyncio.Task] = set()
+
+    async def __call__(self, handler, event, data):
+        admin_ids = data.get("admin_ids")
+        from_user = getattr(event, "from_user", None)
+        if not admin_ids or from_user is None or from_user.id not in admin_ids:
+            return await handler(event, data)
+
+        chat = getattr(event, "chat", None)
+        if chat is None:
+            message = getattr(event, "message", None)
+            chat = message.chat if message is not None else None
+        key = chat.id if chat is not None else from_user.id
+        lock = self._locks.setdefault(key, asyncio.Lock())
+
+        async def _run():
+            async with lock:
+                return await handler(event, data)
+
+        task = asyncio.create_task(_run())
+        self._tasks.add(task)
+        task.add_done_callback(self._on_task_done)
+        return task
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        # The dispatcher never awaits these tasks, so retrieve and log
+        # failures here instead of leaving them to the GC warning.
+        self._tasks.discard(task)
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            _log.error("admin handler task failed", exc_info=exc)
+
 
 class AdminUserStates(StatesGroup):
     add_target = State()
@@ -29,30 +109,51 @@ class AdminUserStates(StatesGroup):
 
 
 def admin_menu_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
+    # Trusted static payload: model_construct skips Pydantic validation.
+    btn = KeyboardButton.model_construct
+    return ReplyKeyboardMarkup.model_construct(
         keyboard=[
-            [KeyboardButton(text="➕ Добавить"), KeyboardButton(text="✏️ Изменить срок")],
-            [KeyboardButton(text="🚫 Бан / Разбан"), KeyboardButton(text="❌ Удалить")],
-            [KeyboardButton(text="📋 Список активных"), KeyboardButton(text="⏳ Истекают скоро (<=7 дней)")],
-            [KeyboardButton(text="🏠 В меню")],
+            [btn(text="➕ Добавить"), btn(text="✏️ Изменить срок")],
+            [btn(text="🚫 Бан / Разбан"), btn(text="❌ Удалить")],
+            [btn(text="📋 Список активных"), btn(text="⏳ Истекают скоро (<=7 дней)")],
+            [btn(text="🏠 В меню")],
         ],
         resize_keyboard=True,
     )
 
 
 def duration_kb(prefix: str) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    btn = InlineKeyboardButton.model_construct
+    return InlineKeyboardMarkup.model_construct(
         inline_keyboard=[
-            [InlineKeyboardButton(text=str(days), callback_data=f"{prefix}:days:{days}") for days in (7, 30, 90, 365)],
-            [InlineKeyboardButton(text="Ввести вручную", callback_data=f"{prefix}:manual")],
+            [btn(text=str(days), callback_data=f"{prefix}:days:{days}") for days in (7, 30, 90, 365)],
+            [btn(text="Ввести вручную", callback_data=f"{prefix}:manual")],
         ]
     )
 
 
+@lru_cache(maxsize=4096)
 def _fmt_exp(value: int | None) -> str:
+    """Format a unix timestamp as '%Y-%m-%d %H:%M UTC' with integer math only.
+
+    Fixed format and UTC let us skip strftime's locale machinery; the
+    date part uses the civil-from-days algorithm on the shifted epoch.
+    """
     if value is None:
         return "Бессрочно"
-    return datetime.fromtimestamp(value, tz=timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    days, sec = divmod(int(value), 86400)
+    hour, rem = divmod(sec, 3600)
+    minute = rem // 60
+    z = days + 719468
+    era = z // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = mp + 3 if mp < 10 else mp - 9
+    year = yoe + era * 400 + (month <= 2)
+    return f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d} UTC"
 
 
 def _target_from_message(message: Message):
@@ -62,9 +163,9 @@ def _target_from_message(message: Message):
     if message.forward_from:
         user = message.forward_from
         return user.id, user.username, user.full_name
-    origin = getattr(message, "forward_origin", None)
-    sender = getattr(origin, "sender_user", None)
-    if sender:
+    origin = message.forward_origin
+    if isinstance(origin, MessageOriginUser):
+        sender = origin.sender_user
         return sender.id, sender.username, sender.full_name
 
     original_text = message.text or ""
@@ -85,12 +186,52 @@ def _target_from_message(message: Message):
     return None
 
 
+@lru_cache(maxsize=128)
+def list_kb(prefix: str, page: int, pages: int) -> InlineKeyboardMarkup:
+    btn = InlineKeyboardButton.model_construct
+    rows = []
+    buttons = []
+    if page > 0:
+        buttons.append(btn(text="⬅️", callback_data=f"{prefix}:page:{page-1}"))
+    if page < pages - 1:
+        buttons.append(btn(text="➡️", callback_data=f"{prefix}:page:{page+1}"))
+    if buttons:
+        rows.append(buttons)
+    return InlineKeyboardMarkup.model_construct(inline_keyboard=rows or [[btn(text="·", callback_data="noop")]])
+
+
+# Bound .format of the per-row list template, compiled once at import.
+_ROW_TMPL = "{name} (@{un})\nID: {tid}\nДо: {exp}".format
+
+
 def _card(data: dict) -> str:
     return f"Имя: {data.get('full_name') or '—'}\n@username: @{data.get('username') or '—'}\nID: {data['telegram_id']}"
 
 
 def build_router(main_menu_builder):
     router = Router(name="admin_users")
+    router.message.filter(IsAdmin())
+    router.callback_query.filter(IsAdmin())
+    concurrency = PerChatConcurrencyMiddleware()
+    router.message.outer_middleware(concurrency)
+    router.callback_query.outer_middleware(concurrency)
+
+    # Static keyboards: built once per router, reused for every interaction.
+    _admin_menu_kb = admin_menu_kb()
+    _add_duration_kb = duration_kb("add")
+    _btn = InlineKeyboardButton.model_construct
+    _edit_current_kb = InlineKeyboardMarkup.model_construct(
+        inline_keyboard=[
+            [_btn(text=f"Продлить на {d}", callback_data=f"edit:plus:{d}") for d in (7, 30, 90, 365)],
+            [_btn(text="Установить новый срок", callback_data="edit:set")],
+            [_btn(text="Сделать бессрочно", callback_data="edit:forever")],
+        ]
+    )
+
+    # username -> (id, username, full_name); get_chat is a 100-300ms API round trip,
+    # and handles are stable enough to reuse for the life of the process.
+    _username_cache: OrderedDict[str, tuple[int, str | None, str | None]] = OrderedDict()
+    _USERNAME_CACHE_MAX = 1024
 
     async def resolve_target(message: Message, users_storage: UsersStorage):
         parsed = _target_from_message(message)
@@ -98,30 +239,34 @@ def build_router(main_menu_builder):
             return None
 
         target = parsed[0]
-        if isinstance(target, str) and target.startswith("@"):
+        is_handle = isinstance(target, str) and target.startswith("@")
+        if is_handle:
             by_username = users_storage.get_user_by_username(target)
             if by_username:
                 return by_username["telegram_id"], by_username["username"], by_username["full_name"]
+            cached = _username_cache.get(target.lower())
+            if cached is not None:
+                _username_cache.move_to_end(target.lower())
+                return cached
 
         try:
             chat = await message.bot.get_chat(target)
         except TelegramBadRequest:
             return None
-        return chat.id, chat.username, chat.full_name
+        resolved = (chat.id, chat.username, chat.full_name)
+        if is_handle:
+            _username_cache[target.lower()] = resolved
+            if len(_username_cache) > _USERNAME_CACHE_MAX:
+                _username_cache.popitem(last=False)
+        return resolved
 
     @router.message(F.text == ADMIN_MENU_BTN)
-    async def open_admin_menu(message: Message, state: FSMContext, admin_ids: set[int], **kwargs):
-        if message.from_user is None or message.from_user.id not in admin_ids:
-            await message.answer("Недостаточно прав")
-            return
+    async def open_admin_menu(message: Message, state: FSMContext, **kwargs):
         await state.clear()
-        await message.answer("Управление пользователями", reply_markup=admin_menu_kb())
+        await message.answer("Управление пользователями", reply_markup=_admin_menu_kb)
 
     @router.message(F.text == "➕ Добавить")
-    async def add_user_start(message: Message, state: FSMContext, admin_ids: set[int], **kwargs):
-        if message.from_user is None or message.from_user.id not in admin_ids:
-            await message.answer("Недостаточно прав")
-            return
+    async def add_user_start(message: Message, state: FSMContext, **kwargs):
         await state.set_state(AdminUserStates.add_target)
         await message.answer("Отправьте @username или перешлите сообщение пользователя")
 
@@ -133,18 +278,20 @@ def build_router(main_menu_builder):
             return
         telegram_id, username, full_name = resolved
         data = {"telegram_id": telegram_id, "username": username, "full_name": full_name}
-        await state.update_data(target=data)
+        # set_data: the dialog starts fresh here, no need for update_data's read-merge-write.
+        await state.set_data({"target": data})
         await state.set_state(AdminUserStates.add_days)
-        await message.answer(_card(data), reply_markup=duration_kb("add"))
+        await message.answer(_card(data), reply_markup=_add_duration_kb)
 
-    @router.callback_query(F.data.startswith("add:days:"), StateFilter(AdminUserStates.add_days))
+    @router.callback_query(F.data.startswith(ADD_DAYS_PREFIX), StateFilter(AdminUserStates.add_days))
     async def add_user_days(callback: CallbackQuery, state: FSMContext, users_storage: UsersStorage, **kwargs):
-        days = int(callback.data.split(":")[-1])
+        days = int(callback.data.rpartition(":")[2])
         data = await state.get_data()
         target = data["target"]
         expires_at = now_ts() + days * SECONDS_IN_DAY
         users_storage.upsert_user(target["telegram_id"], target.get("username"), target.get("full_name"), expires_at, is_banned=0)
-        logging.info("admin_action add_user admin_id=%s target_id=%s days=%s", callback.from_user.id if callback.from_user else None, target["telegram_id"], days)
+        if _log.isEnabledFor(logging.INFO):
+            _log.info("admin_action add_user admin_id=%s target_id=%s days=%s", callback.from_user.id, target["telegram_id"], days)
         await state.clear()
         await callback.message.answer(f"Доступ активен до {_fmt_exp(expires_at)}", reply_markup=main_menu_builder(True))
         await callback.answer()
@@ -156,15 +303,20 @@ def build_router(main_menu_builder):
 
     @router.message(AdminUserStates.add_days)
     async def add_user_days_manual(message: Message, state: FSMContext, users_storage: UsersStorage, **kwargs):
-        if not (message.text or "").strip().isdigit():
+        text = (message.text or "").strip()
+        try:
+            days = int(text)
+        except ValueError:
+            days = 0
+        if days <= 0:
             await message.answer("Введите корректное число дней")
             return
-        days = int(message.text.strip())
         data = await state.get_data()
         target = data["target"]
         expires_at = now_ts() + days * SECONDS_IN_DAY
         users_storage.upsert_user(target["telegram_id"], target.get("username"), target.get("full_name"), expires_at, is_banned=0)
-        logging.info("admin_action add_user admin_id=%s target_id=%s days=%s", message.from_user.id if message.from_user else None, target["telegram_id"], days)
+        if _log.isEnabledFor(logging.INFO):
+            _log.info("admin_action add_user admin_id=%s target_id=%s days=%s", message.from_user.id, target["telegram_id"], days)
         await state.clear()
         await message.answer(f"Доступ активен до {_fmt_exp(expires_at)}", reply_markup=main_menu_builder(True))
 
@@ -174,15 +326,12 @@ def build_router(main_menu_builder):
             await message.answer("Не удалось определить пользователя. Перешлите сообщение пользователя.")
             return None
         telegram_id, username, full_name = resolved
-        await state.update_data(target={"telegram_id": telegram_id, "username": username, "full_name": full_name})
+        await state.set_data({"target": {"telegram_id": telegram_id, "username": username, "full_name": full_name}})
         await state.set_state(next_state)
         return telegram_id
 
     @router.message(F.text == "✏️ Изменить срок")
-    async def edit_start(message: Message, state: FSMContext, admin_ids: set[int], **kwargs):
-        if message.from_user is None or message.from_user.id not in admin_ids:
-            await message.answer("Недостаточно прав")
-            return
+    async def edit_start(message: Message, state: FSMContext, **kwargs):
         await state.set_state(AdminUserStates.edit_target)
         await message.answer("Отправьте @username или перешлите сообщение пользователя")
 
@@ -193,24 +342,18 @@ def build_router(main_menu_builder):
             return
         row = users_storage.get_user(user_id)
         current = _fmt_exp(int(row["expires_at"])) if row and row["expires_at"] is not None else "Бессрочно / отсутствует"
-        kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text=f"Продлить на {d}", callback_data=f"edit:plus:{d}") for d in (7,30,90,365)], [InlineKeyboardButton(text="Установить новый срок", callback_data="edit:set")], [InlineKeyboardButton(text="Сделать бессрочно", callback_data="edit:forever")]])
-        await message.answer(f"Текущий срок: {current}", reply_markup=kb)
+        await message.answer(f"Текущий срок: {current}", reply_markup=_edit_current_kb)
 
-    @router.callback_query(F.data.startswith("edit:plus:"), StateFilter(AdminUserStates.edit_days))
-    async def edit_plus(callback: CallbackQuery, state: FSMContext, users_storage: UsersStorage, admin_ids: set[int], **kwargs):
-        days = int(callback.data.split(":")[-1])
+    @router.callback_query(F.data.startswith(EDIT_PLUS_PREFIX), StateFilter(AdminUserStates.edit_days))
+    async def edit_plus(callback: CallbackQuery, state: FSMContext, users_storage: UsersStorage, admin_ids: frozenset[int], **kwargs):
+        days = int(callback.data.rpartition(":")[2])
         target = (await state.get_data())["target"]
         if target["telegram_id"] in admin_ids:
             await callback.answer("Нельзя изменить ADMIN", show_alert=True)
             return
-        row = users_storage.get_user(target["telegram_id"])
-        base = now_ts() if row is None or row["expires_at"] is None or int(row["expires_at"]) < now_ts() else int(row["expires_at"])
-        new_exp = base + days * SECONDS_IN_DAY
-        if row:
-            users_storage.update_expiration(target["telegram_id"], new_exp)
-        else:
-            users_storage.upsert_user(target["telegram_id"], target.get("username"), target.get("full_name"), new_exp)
-        logging.info("admin_action extend_user admin_id=%s target_id=%s days=%s", callback.from_user.id if callback.from_user else None, target["telegram_id"], days)
+        new_exp = users_storage.extend_expiration(target["telegram_id"], target.get("username"), target.get("full_name"), days * SECONDS_IN_DAY, now_ts())
+        if _log.isEnabledFor(logging.INFO):
+            _log.info("admin_action extend_user admin_id=%s target_id=%s days=%s", callback.from_user.id, target["telegram_id"], days)
         await state.clear()
         await callback.message.answer(f"Новый срок: {_fmt_exp(new_exp)}", reply_markup=main_menu_builder(True))
         await callback.answer()
@@ -221,50 +364,45 @@ def build_router(main_menu_builder):
         await callback.answer()
 
     @router.message(AdminUserStates.edit_days)
-    async def edit_set_days(message: Message, state: FSMContext, users_storage: UsersStorage, admin_ids: set[int], **kwargs):
-        if not (message.text or "").strip().isdigit():
+    async def edit_set_days(message: Message, state: FSMContext, users_storage: UsersStorage, admin_ids: frozenset[int], **kwargs):
+        text = (message.text or "").strip()
+        try:
+            days = int(text)
+        except ValueError:
+            days = 0
+        if days <= 0:
             return
         target = (await state.get_data())["target"]
         if target["telegram_id"] in admin_ids:
             await message.answer("Нельзя изменить ADMIN")
             return
-        days = int(message.text.strip())
         exp = now_ts() + days * SECONDS_IN_DAY
-        row = users_storage.get_user(target["telegram_id"])
-        if row:
-            users_storage.update_expiration(target["telegram_id"], exp)
-        else:
-            users_storage.upsert_user(target["telegram_id"], target.get("username"), target.get("full_name"), exp)
-        logging.info("admin_action set_expiration admin_id=%s target_id=%s days=%s", message.from_user.id if message.from_user else None, target["telegram_id"], days)
+        users_storage.upsert_expiration(target["telegram_id"], target.get("username"), target.get("full_name"), exp)
+        if _log.isEnabledFor(logging.INFO):
+            _log.info("admin_action set_expiration admin_id=%s target_id=%s days=%s", message.from_user.id, target["telegram_id"], days)
         await state.clear()
         await message.answer(f"Новый срок: {_fmt_exp(exp)}", reply_markup=main_menu_builder(True))
 
     @router.callback_query(F.data == "edit:forever", StateFilter(AdminUserStates.edit_days))
-    async def edit_forever(callback: CallbackQuery, state: FSMContext, users_storage: UsersStorage, admin_ids: set[int], **kwargs):
+    async def edit_forever(callback: CallbackQuery, state: FSMContext, users_storage: UsersStorage, admin_ids: frozenset[int], **kwargs):
         target = (await state.get_data())["target"]
         if target["telegram_id"] in admin_ids:
             await callback.answer("Нельзя изменить ADMIN", show_alert=True)
             return
-        row = users_storage.get_user(target["telegram_id"])
-        if row:
-            users_storage.update_expiration(target["telegram_id"], None)
-        else:
-            users_storage.upsert_user(target["telegram_id"], target.get("username"), target.get("full_name"), None)
-        logging.info("admin_action set_forever admin_id=%s target_id=%s", callback.from_user.id if callback.from_user else None, target["telegram_id"])
+        users_storage.upsert_expiration(target["telegram_id"], target.get("username"), target.get("full_name"), None)
+        if _log.isEnabledFor(logging.INFO):
+            _log.info("admin_action set_forever admin_id=%s target_id=%s", callback.from_user.id, target["telegram_id"])
         await state.clear()
         await callback.message.answer("Срок: бессрочно", reply_markup=main_menu_builder(True))
         await callback.answer()
 
     @router.message(F.text == "🚫 Бан / Разбан")
-    async def ban_start(message: Message, state: FSMContext, admin_ids: set[int], **kwargs):
-        if message.from_user is None or message.from_user.id not in admin_ids:
-            await message.answer("Недостаточно прав")
-            return
+    async def ban_start(message: Message, state: FSMContext, **kwargs):
         await state.set_state(AdminUserStates.ban_target)
         await message.answer("Отправьте @username или перешлите сообщение пользователя")
 
     @router.message(AdminUserStates.ban_target)
-    async def ban_toggle(message: Message, state: FSMContext, users_storage: UsersStorage, admin_ids: set[int], **kwargs):
+    async def ban_toggle(message: Message, state: FSMContext, users_storage: UsersStorage, admin_ids: frozenset[int], **kwargs):
         resolved = await resolve_target(message, users_storage)
         if not resolved:
             await message.answer("Не удалось определить пользователя")
@@ -273,26 +411,19 @@ def build_router(main_menu_builder):
         if telegram_id in admin_ids or (message.from_user and telegram_id == message.from_user.id):
             await message.answer("Этого пользователя нельзя банить")
             return
-        row = users_storage.get_user(telegram_id)
-        is_banned = not bool(row and int(row["is_banned"]) == 1)
-        if row:
-            users_storage.set_ban(telegram_id, is_banned)
-        else:
-            users_storage.upsert_user(telegram_id, username, full_name, None, is_banned=1 if is_banned else 0)
-        logging.info("admin_action toggle_ban admin_id=%s target_id=%s is_banned=%s", message.from_user.id if message.from_user else None, telegram_id, is_banned)
+        is_banned = users_storage.toggle_ban(telegram_id, username, full_name)
+        if _log.isEnabledFor(logging.INFO):
+            _log.info("admin_action toggle_ban admin_id=%s target_id=%s is_banned=%s", message.from_user.id, telegram_id, is_banned)
         await state.clear()
         await message.answer("Пользователь забанен" if is_banned else "Пользователь разбанен", reply_markup=main_menu_builder(True))
 
     @router.message(F.text == "❌ Удалить")
-    async def delete_start(message: Message, state: FSMContext, admin_ids: set[int], **kwargs):
-        if message.from_user is None or message.from_user.id not in admin_ids:
-            await message.answer("Недостаточно прав")
-            return
+    async def delete_start(message: Message, state: FSMContext, **kwargs):
         await state.set_state(AdminUserStates.delete_target)
         await message.answer("Отправьте @username или перешлите сообщение пользователя")
 
     @router.message(AdminUserStates.delete_target)
-    async def delete_user(message: Message, state: FSMContext, users_storage: UsersStorage, admin_ids: set[int], **kwargs):
+    async def delete_user(message: Message, state: FSMContext, users_storage: UsersStorage, admin_ids: frozenset[int], **kwargs):
         resolved = await resolve_target(message, users_storage)
         if not resolved:
             await message.answer("Не удалось определить пользователя")
@@ -302,71 +433,55 @@ def build_router(main_menu_builder):
             await message.answer("Этого пользователя нельзя удалить")
             return
         users_storage.delete_user(telegram_id)
-        logging.info("admin_action delete_user admin_id=%s target_id=%s", message.from_user.id if message.from_user else None, telegram_id)
+        if _log.isEnabledFor(logging.INFO):
+            _log.info("admin_action delete_user admin_id=%s target_id=%s", message.from_user.id, telegram_id)
         await state.clear()
         await message.answer("Пользователь удален", reply_markup=main_menu_builder(True))
 
-    def list_kb(prefix: str, page: int, pages: int) -> InlineKeyboardMarkup:
-        rows = []
-        buttons = []
-        if page > 0:
-            buttons.append(InlineKeyboardButton(text="⬅️", callback_data=f"{prefix}:page:{page-1}"))
-        if page < pages - 1:
-            buttons.append(InlineKeyboardButton(text="➡️", callback_data=f"{prefix}:page:{page+1}"))
-        if buttons:
-            rows.append(buttons)
-        return InlineKeyboardMarkup(inline_keyboard=rows or [[InlineKeyboardButton(text="·", callback_data="noop")]])
-
     async def render_list(message: Message, users_storage: UsersStorage, expiring: bool, page: int) -> None:
         now = now_ts()
         if expiring:
             until = now + 7 * SECONDS_IN_DAY
-            total = users_storage.count_expiring(now, until)
-            rows = users_storage.list_expiring(now, until, page * LIST_PAGE_SIZE)
+            total, rows = users_storage.list_expiring_with_count(now, until, page * LIST_PAGE_SIZE)
             prefix = "expiring"
             title = "Истекают скоро"
         else:
-            total = users_storage.count_active(now)
-            rows = users_storage.list_active(now, page * LIST_PAGE_SIZE)
+            total, rows = users_storage.list_active_with_count(now, page * LIST_PAGE_SIZE)
             prefix = "active"
             title = "Активные"
-        pages = ceil(total / LIST_PAGE_SIZE) if total else 1
-        text_rows = [f"{title} (стр. {page+1}/{pages})"]
-        for row in rows:
-            text_rows.append(f"{row['full_name'] or '—'} (@{row['username'] or '—'})\nID: {row['telegram_id']}\nДо: {_fmt_exp(row['expires_at'])}")
-        if len(rows) == 0:
-            text_rows.append("Список пуст")
-        await message.answer("\n\n".join(text_rows), reply_markup=list_kb(prefix, page, pages))
+        pages = -(-total // LIST_PAGE_SIZE) or 1
+        header = f"{title} (стр. {page+1}/{pages})"
+        if rows:
+            body = "\n\n".join(
+                chain(
+                    (header,),
+                    (
+                        _ROW_TMPL(name=row["full_name"] or "—", un=row["username"] or "—", tid=row["telegram_id"], exp=_fmt_exp(row["expires_at"]))
+                        for row in rows
+                    ),
+                )
+            )
+        else:
+            body = f"{header}\n\nСписок пуст"
+        await message.answer(body, reply_markup=list_kb(prefix, page, pages))
 
     @router.message(F.text == "📋 Список активных")
-    async def list_active(message: Message, users_storage: UsersStorage, admin_ids: set[int], **kwargs):
-        if message.from_user is None or message.from_user.id not in admin_ids:
-            await message.answer("Недостаточно прав")
-            return
+    async def list_active(message: Message, users_storage: UsersStorage, **kwargs):
         await render_list(message, users_storage, expiring=False, page=0)
 
     @router.message(F.text == "⏳ Истекают скоро (<=7 дней)")
-    async def list_expiring(message: Message, users_storage: UsersStorage, admin_ids: set[int], **kwargs):
-        if message.from_user is None or message.from_user.id not in admin_ids:
-            await message.answer("Недостаточно прав")
-            return
+    async def list_expiring(message: Message, users_storage: UsersStorage, **kwargs):
         await render_list(message, users_storage, expiring=True, page=0)
 
-    @router.callback_query(F.data.startswith("active:page:"))
-    async def paginate_active(callback: CallbackQuery, users_storage: UsersStorage, admin_ids: set[int], **kwargs):
-        if callback.from_user is None or callback.from_user.id not in admin_ids:
-            await callback.answer("Недостаточно прав", show_alert=True)
-            return
-        page = int(callback.data.split(":")[-1])
+    @router.callback_query(F.data.startswith(ACTIVE_PAGE_PREFIX))
+    async def paginate_active(callback: CallbackQuery, users_storage: UsersStorage, **kwargs):
+        page = int(callback.data.rpartition(":")[2])
         await render_list(callback.message, users_storage, expiring=False, page=page)
         await callback.answer()
 
-    @router.callback_query(F.data.startswith("expiring:page:"))
-    async def paginate_expiring(callback: CallbackQuery, users_storage: UsersStorage, admin_ids: set[int], **kwargs):
-        if callback.from_user is None or callback.from_user.id not in admin_ids:
-            await callback.answer("Недостаточно прав", show_alert=True)
-            return
-        page = int(callback.data.split(":")[-1])
+    @router.callback_query(F.data.startswith(EXPIRING_PAGE_PREFIX))
+    async def paginate_expiring(callback: CallbackQuery, users_storage: UsersStorage, **kwargs):
+        page = int(callback.data.rpartition(":")[2])
         await render_list(callback.message, users_storage, expiring=True, page=page)
         await callback.answer()
 
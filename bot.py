@@ -1,11 +1,17 @@
 import asyncio
+import json
 import logging
 import os
-import re
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+from functools import lru_cache
 
-from aiogram import Bot, Dispatcher, F
+from aiogram import BaseMiddleware, Bot, Dispatcher, F
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import CommandStart
+from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
@@ -43,6 +49,10 @@ class DeleteStates(StatesGroup):
 
 from storage import CATEGORY_OPTIONS, Storage, normalize_url
 
+_URL_PREFIXES = ("http://", "https://")
+_CATEGORY_SET = frozenset(CATEGORY_OPTIONS)
+
+@lru_cache(maxsize=None)
 def edit_actions_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -54,6 +64,7 @@ def edit_actions_kb() -> InlineKeyboardMarkup:
     )
 
 
+@lru_cache(maxsize=None)
 def search_category_kb() -> ReplyKeyboardMarkup:
     rows = [[KeyboardButton(text=category)] for category in CATEGORY_OPTIONS]
     rows.append([KeyboardButton(text=BACK), KeyboardButton(text=CANCEL), KeyboardButton(text=MENU)])
@@ -61,7 +72,12 @@ def search_category_kb() -> ReplyKeyboardMarkup:
 
 
 def category_choice_kb(selected: list[str] | None = None) -> ReplyKeyboardMarkup:
-    selected_set = set(selected or [])
+    return _category_choice_kb_cached(tuple(sorted(selected or ())))
+
+
+@lru_cache(maxsize=1024)
+def _category_choice_kb_cached(selected: tuple[str, ...]) -> ReplyKeyboardMarkup:
+    selected_set = set(selected)
     rows = []
     for category in CATEGORY_OPTIONS:
         mark = "✅ " if category in selected_set else "▫️ "
@@ -75,6 +91,7 @@ def category_choice_kb(selected: list[str] | None = None) -> ReplyKeyboardMarkup
     return ReplyKeyboardMarkup(keyboard=rows, resize_keyboard=True)
 
 
+@lru_cache(maxsize=2)
 def main_menu_kb(can_edit: bool) -> ReplyKeyboardMarkup:
     if can_edit:
         rows = [
@@ -94,6 +111,7 @@ def main_menu_kb(can_edit: bool) -> ReplyKeyboardMarkup:
     )
 
 
+@lru_cache(maxsize=None)
 def nav_kb() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
@@ -103,40 +121,73 @@ def nav_kb() -> ReplyKeyboardMarkup:
     )
 
 
-def pagination_kb(prefix: str, page: int, total_pages: int) -> InlineKeyboardMarkup:
+class PageCB(CallbackData, prefix="p"):
+    """Packed pagination payload: mode/filter as small ints, query escaped."""
+
+    mode: int
+    ft: int
+    q: str
+    page: int
+
+
+_PAGE_MODES = ("search", "favorites", "all", "titles")
+_PAGE_FILTERS = ("category", "title", "all", "favorite")
+
+
+@lru_cache(maxsize=4096)
+def _pagination_row(mode: int, ft: int, q: str, page: int, total_pages: int) -> tuple[InlineKeyboardButton, ...]:
+    def cb(p: int) -> str:
+        return PageCB(mode=mode, ft=ft, q=q, page=p).pack()
+
     buttons: list[InlineKeyboardButton] = []
     if page > 0:
-        buttons.append(InlineKeyboardButton(text="⬅️", callback_data=f"{prefix}:page:{page-1}"))
+        buttons.append(InlineKeyboardButton(text="⬅️", callback_data=cb(page - 1)))
     start = max(0, page - 1)
     end = min(total_pages, page + 2)
     for p in range(start, end):
         buttons.append(
             InlineKeyboardButton(
                 text=f"[{p+1}]" if p == page else str(p + 1),
-                callback_data=f"{prefix}:page:{p}",
+                callback_data=cb(p),
             )
         )
     if page < total_pages - 1:
-        buttons.append(InlineKeyboardButton(text="➡️", callback_data=f"{prefix}:page:{page+1}"))
-    return InlineKeyboardMarkup(inline_keyboard=[buttons] if buttons else [[]])
+        buttons.append(InlineKeyboardButton(text="➡️", callback_data=cb(page + 1)))
+    return tuple(buttons)
 
 
-def video_card_text(storage: Storage, row) -> str:
-    categories = ", ".join(storage.video_categories(row["id"])) or "—"
-    return f"🔥 {row['title']}\nКатегории: {categories}"
+def pagination_kb(mode: str, filter_type: str, query: str, page: int, total_pages: int) -> InlineKeyboardMarkup:
+    encoded_query = query.replace(":", "%3A")
+    row = _pagination_row(_PAGE_MODES.index(mode), _PAGE_FILTERS.index(filter_type), encoded_query, page, total_pages)
+    return InlineKeyboardMarkup(inline_keyboard=[list(row)] if row else [[]])
 
 
+def video_card_text(storage: Storage, row, categories: list[str] | None = None) -> str:
+    if categories is None:
+        raw = row["categories_json"] if "categories_json" in row.keys() else None
+        categories = json.loads(raw) if raw else storage.video_categories(row["id"])
+    return f"🔥 {row['title']}\nКатегории: {', '.join(categories) or '—'}"
+
+
+# callback_data templates for the per-video action buttons.
+_WATCH_TMPL = "video:view:{}".format
+_FAV_TMPL = "video:fav:{}".format
+_EDIT_TMPL = "video:edit:{}".format
+_DEL_TMPL = "video:delete:{}".format
+
+
+@lru_cache(maxsize=1024)
 def video_actions_kb(video_id: int, is_favorite: bool, can_edit: bool) -> InlineKeyboardMarkup:
     fav = "💔 Убрать из избранного" if is_favorite else "⭐ Добавить в избранное"
     rows = [
-        [InlineKeyboardButton(text="▶️ Смотреть", callback_data=f"video:view:{video_id}")],
-        [InlineKeyboardButton(text=fav, callback_data=f"video:fav:{video_id}")],
+        [InlineKeyboardButton(text="▶️ Смотреть", callback_data=_WATCH_TMPL(video_id))],
+        [InlineKeyboardButton(text=fav, callback_data=_FAV_TMPL(video_id))],
     ]
     if can_edit:
         rows.extend(
             [
-                [InlineKeyboardButton(text="✏️ Редактировать", callback_data=f"video:edit:{video_id}")],
-                [InlineKeyboardButton(text="🗑 Удалить", callback_data=f"video:delete:{video_id}")],
+                [InlineKeyboardButton(text="✏️ Редактировать", callback_data=_EDIT_TMPL(video_id))],
+                [InlineKeyboardButton(text="🗑 Удалить", callback_data=_DEL_TMPL(video_id))],
             ]
         )
     return InlineKeyboardMarkup(inline_keyboard=rows)
@@ -146,10 +197,32 @@ load_dotenv()
 STORAGE_CHAT_ID = int(os.getenv("STORAGE_CHAT_ID", "0"))
 ADMIN_IDS = parse_admin_ids()
 
+def build_fsm_storage():
+    """FSM backend: Redis when REDIS_URL is set (shared state, survives restarts), else in-memory."""
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
+
+        return RedisStorage.from_url(
+            redis_url,
+            key_builder=DefaultKeyBuilder(with_bot_id=True),
+            state_ttl=3600,
+            data_ttl=3600,
+        )
+    return MemoryStorage()
+
+
+# Configure logging before the storages open: schema-migration messages
+# are emitted during Storage() construction. setup_logging() later swaps
+# the handlers onto a queue; its basicConfig call is then a no-op.
+logging.basicConfig(level=logging.INFO)
+
 storage = Storage()
 users_storage = UsersStorage()
-storage.ensure_taxonomy()
-dp = Dispatcher(storage=MemoryStorage())
+dp = Dispatcher(storage=build_fsm_storage())
+# Workflow data reaches handlers in both polling and webhook modes.
+dp["admin_ids"] = ADMIN_IDS
+dp["users_storage"] = users_storage
 dp.include_router(build_router(main_menu_kb))
 
 
@@ -167,9 +240,21 @@ def can_manage_content(user_id: int | None) -> bool:
     return user_id in ADMIN_IDS if user_id is not None else False
 
 
-async def ensure_manage_access(message: Message, state: FSMContext | None = None) -> bool:
-    user_id = message.from_user.id if message.from_user else None
-    if can_manage_content(user_id):
+class AccessMiddleware(BaseMiddleware):
+    """Stashes can_manage in handler data so it is computed once per update."""
+
+    async def __call__(self, handler, event, data):
+        user = getattr(event, "from_user", None)
+        data["can_manage"] = can_manage_content(user.id if user else None)
+        return await handler(event, data)
+
+
+dp.message.middleware(AccessMiddleware())
+dp.callback_query.middleware(AccessMiddleware())
+
+
+async def ensure_manage_access(message: Message, state: FSMContext | None, can_manage: bool) -> bool:
+    if can_manage:
         return True
     if state:
         await state.clear()
@@ -179,9 +264,8 @@ async def ensure_manage_access(message: Message, state: FSMContext | None = None
 
 
 
-async def ensure_manage_callback_access(callback: CallbackQuery, state: FSMContext | None = None) -> bool:
-    user_id = callback.from_user.id if callback.from_user else None
-    if can_manage_content(user_id):
+async def ensure_manage_callback_access(callback: CallbackQuery, state: FSMContext | None, can_manage: bool) -> bool:
+    if can_manage:
         return True
     if state:
         await state.clear()
@@ -200,46 +284,63 @@ async def copy_video_to_vault(bot: Bot, from_chat_id: int, message_id: int) -> t
     return STORAGE_CHAT_ID, copied.message_id
 
 
-async def go_menu(message: Message, state: FSMContext) -> None:
+# Pending background vault copies keyed by the source (chat_id, message_id).
+_vault_copy_tasks: dict[tuple[int, int], asyncio.Task] = {}
+
+
+def _spawn_vault_copy(message: Message) -> None:
+    """Start the vault copy without blocking the reply; add_save awaits it later."""
+    if len(_vault_copy_tasks) > 64:
+        for key, task in list(_vault_copy_tasks.items()):
+            if task.done():
+                if not task.cancelled() and task.exception():
+                    logging.error("Vault copy failed in background: %s", task.exception())
+                del _vault_copy_tasks[key]
+    _vault_copy_tasks[(message.chat.id, message.message_id)] = asyncio.create_task(
+        copy_video_to_vault(message.bot, message.chat.id, message.message_id)
+    )
+
+
+async def go_menu(message: Message, state: FSMContext, can_manage: bool) -> None:
     await state.clear()
-    await message.answer("Главное меню", reply_markup=main_menu_kb(can_manage_content(message.from_user.id if message.from_user else None)))
+    await message.answer("Главное меню", reply_markup=main_menu_kb(can_manage))
 
 
 @dp.message(CommandStart())
-async def start(message: Message, state: FSMContext) -> None:
+async def start(message: Message, state: FSMContext, can_manage: bool) -> None:
     if not await ensure_user_allowed(message, state):
         return
-    await go_menu(message, state)
+    await go_menu(message, state, can_manage)
 
 
 @dp.message(F.text == MENU)
-async def menu_btn(message: Message, state: FSMContext) -> None:
+async def menu_btn(message: Message, state: FSMContext, can_manage: bool) -> None:
     if not await ensure_user_allowed(message, state):
         return
-    await go_menu(message, state)
+    await go_menu(message, state, can_manage)
 
 
 @dp.message(F.text.in_({"➕ Видео", "➕ Добавить видео"}))
-async def add_video_start(message: Message, state: FSMContext) -> None:
-    if not await ensure_manage_access(message, state):
+async def add_video_start(message: Message, state: FSMContext, can_manage: bool) -> None:
+    if not await ensure_manage_access(message, state, can_manage):
         return
     await state.set_state(AddVideoStates.wait_video)
     await message.answer("Пришлите видеофайл Telegram или URL.", reply_markup=nav_kb())
 
 
 @dp.message(AddVideoStates.wait_video, F.text == BACK)
-async def add_video_back_from_video(message: Message, state: FSMContext) -> None:
-    await go_menu(message, state)
+async def add_video_back_from_video(message: Message, state: FSMContext, can_manage: bool) -> None:
+    await go_menu(message, state, can_manage)
 
 
 @dp.message(AddVideoStates.wait_video, F.text == CANCEL)
-async def add_video_cancel_video(message: Message, state: FSMContext) -> None:
+async def add_video_cancel_video(message: Message, state: FSMContext, can_manage: bool) -> None:
     await state.clear()
-    await message.answer("Добавление отменено.", reply_markup=main_menu_kb(can_manage_content(message.from_user.id if message.from_user else None)))
+    await message.answer("Добавление отменено.", reply_markup=main_menu_kb(can_manage))
 
 
 @dp.message(AddVideoStates.wait_video)
-async def add_video_video(message: Message, state: FSMContext) -> None:
+async def add_video_video(message: Message, state: FSMContext, can_manage: bool) -> None:
     if not await ensure_user_allowed(message, state):
         return
     file_id = file_unique_id = source_url = None
@@ -248,30 +349,32 @@ async def add_video_video(message: Message, state: FSMContext) -> None:
         file_id = message.video.file_id
         file_unique_id = message.video.file_unique_id
 
-        if STORAGE_CHAT_ID:
-            try:
-                copied_meta = await copy_video_to_vault(message.bot, message.chat.id, message.message_id)
-                if copied_meta:
-                    storage_chat_id, storage_message_id = copied_meta
-            except Exception as exc:
-                logging.exception("Failed to copy source video to storage chat: %s", exc)
-                await message.answer("⚠️ Не удалось скопировать видео в vault-канал. Проверьте права бота в канале.")
-
         existing = storage.find_video_by_file_uid(file_unique_id)
         if existing:
-            if storage_chat_id and storage_message_id:
-                storage.save_storage_message(existing["id"], storage_chat_id, storage_message_id)
+            if STORAGE_CHAT_ID:
+                try:
+                    copied_meta = await copy_video_to_vault(message.bot, message.chat.id, message.message_id)
+                    if copied_meta:
+                        storage.save_storage_message(existing["id"], *copied_meta)
+                except Exception as exc:
+                    logging.exception("Failed to copy source video to storage chat: %s", exc)
+                    await message.answer("⚠️ Не удалось скопировать видео в vault-канал. Проверьте права бота в канале.")
             await message.answer("Такое видео уже есть, запись обновлена в vault.")
-            await send_video_card(message, existing, message.from_user.id)
-            await go_menu(message, state)
+            await send_video_card(message, existing, message.from_user.id, can_manage)
+            await go_menu(message, state, can_manage)
             return
-    elif message.text and re.match(r"https?://", message.text.strip()):
+
+        # The copy overlaps with the user typing the title/choosing categories;
+        # add_save picks up the result.
+        if STORAGE_CHAT_ID:
+            _spawn_vault_copy(message)
+    elif message.text and message.text.strip().startswith(_URL_PREFIXES):
         source_url = message.text.strip()
         existing = storage.find_video_by_url(normalize_url(source_url))
         if existing:
             await message.answer("Видео по этой ссылке уже есть, дубликат не создан.")
-            await send_video_card(message, existing, message.from_user.id)
-            await go_menu(message, state)
+            await send_video_card(message, existing, message.from_user.id, can_manage)
+            await go_menu(message, state, can_manage)
             return
     else:
         await message.answer("Нужно отправить видеофайл или URL. Попробуйте снова.")
@@ -297,9 +400,9 @@ async def add_video_title_back(message: Message, state: FSMContext) -> None:
 
 
 @dp.message(AddVideoStates.wait_title, F.text == CANCEL)
-async def add_video_title_cancel(message: Message, state: FSMContext) -> None:
+async def add_video_title_cancel(message: Message, state: FSMContext, can_manage: bool) -> None:
     await state.clear()
-    await message.answer("Добавление отменено.", reply_markup=main_menu_kb(can_manage_content(message.from_user.id if message.from_user else None)))
+    await message.answer("Добавление отменено.", reply_markup=main_menu_kb(can_manage))
 
 
 @dp.message(AddVideoStates.wait_title)
@@ -332,8 +435,8 @@ async def add_video_title(message: Message, state: FSMContext) -> None:
 
 
 @dp.callback_query(F.data.startswith("add:dup:"))
-async def add_duplicate_choice(callback: CallbackQuery, state: FSMContext) -> None:
-    if not await ensure_manage_callback_access(callback, state):
+async def add_duplicate_choice(callback: CallbackQuery, state: FSMContext, can_manage: bool) -> None:
+    if not await ensure_manage_callback_access(callback, state, can_manage):
         return
     choice = callback.data.split(":")[-1]
     if choice == "rename":
@@ -357,9 +460,9 @@ async def add_categories_back(message: Message, state: FSMContext) -> None:
 
 
 @dp.message(AddVideoStates.wait_categories, F.text == CANCEL)
-async def add_categories_cancel(message: Message, state: FSMContext) -> None:
+async def add_categories_cancel(message: Message, state: FSMContext, can_manage: bool) -> None:
     await state.clear()
-    await message.answer("Добавление отменено.", reply_markup=main_menu_kb(can_manage_content(message.from_user.id if message.from_user else None)))
+    await message.answer("Добавление отменено.", reply_markup=main_menu_kb(can_manage))
 
 
 @dp.message(AddVideoStates.wait_categories)
@@ -384,21 +487,20 @@ async def add_categories(message: Message, state: FSMContext) -> None:
     category = None
     if text.startswith("✅ ") or text.startswith("▫️ "):
         category = text[2:].strip()
-    elif text in CATEGORY_OPTIONS:
+    elif text in _CATEGORY_SET:
         category = text
 
     if category is not None:
-        if category not in CATEGORY_OPTIONS:
+        if category not in _CATEGORY_SET:
             await message.answer("Выберите категорию кнопкой из списка.")
             return
 
         data = await state.get_data()
-        current = data.get("categories", [])
-        if category in current:
-            current = [c for c in current if c != category]
-        else:
-            current.append(category)
-
+        current_set = set(data.get("categories", ()))
+        current_set.symmetric_difference_update((category,))
+        # sorted keeps the list canonical, so category_choice_kb's LRU
+        # sees one key per selection regardless of click order
+        current = sorted(current_set)
         await state.update_data(categories=current)
         await message.answer(
             f"Выбрано: {', '.join(current) if current else 'ничего'}",
@@ -417,14 +519,14 @@ async def add_confirm_back(message: Message, state: FSMContext) -> None:
 
 
 @dp.message(AddVideoStates.confirm, F.text == CANCEL)
-async def add_confirm_cancel(message: Message, state: FSMContext) -> None:
+async def add_confirm_cancel(message: Message, state: FSMContext, can_manage: bool) -> None:
     await state.clear()
-    await message.answer("Добавление отменено.", reply_markup=main_menu_kb(can_manage_content(message.from_user.id if message.from_user else None)))
+    await message.answer("Добавление отменено.", reply_markup=main_menu_kb(can_manage))
 
 
 @dp.callback_query(F.data == "add:save")
-async def add_save(callback: CallbackQuery, state: FSMContext) -> None:
-    if not await ensure_manage_callback_access(callback, state):
+async def add_save(callback: CallbackQuery, state: FSMContext, can_manage: bool) -> None:
+    if not await ensure_manage_callback_access(callback, state, can_manage):
         return
     data = await state.get_data()
     duplicate_choice = data.get("duplicate_choice")
@@ -439,17 +541,16 @@ async def add_save(callback: CallbackQuery, state: FSMContext) -> None:
             data["categories"],
         )
         row = storage.get_video(duplicate_video_id)
-        await callback.message.answer("Видео заменено.")
+        status = "Видео заменено."
     else:
         if data.get("file_unique_id"):
-            vid = storage.upsert_video_file(
+            vid = storage.upsert_video_file_with_categories(
                 data["title"],
                 data.get("file_id"),
                 data.get("file_unique_id"),
                 data.get("source_url"),
+                data["categories"],
             )
-            storage._set_categories(vid, data["categories"])
-            storage.conn.commit()
         else:
             vid = storage.create_video(
                 data["title"],
@@ -459,14 +560,25 @@ async def add_save(callback: CallbackQuery, state: FSMContext) -> None:
                 data["categories"],
             )
         row = storage.get_video(vid)
-        await callback.message.answer("Видео сохранено.")
+        status = "Видео сохранено."
 
-    if data.get("file_unique_id") and data.get("storage_chat_id") and data.get("storage_message_id"):
-        storage.save_storage_message(row["id"], data["storage_chat_id"], data["storage_message_id"])
+    storage_chat_id = data.get("storage_chat_id")
+    storage_message_id = data.get("storage_message_id")
+    copy_task = _vault_copy_tasks.pop((data.get("source_chat_id"), data.get("source_message_id")), None)
+    if copy_task is not None:
+        try:
+            copied_meta = await copy_task
+            if copied_meta:
+                storage_chat_id, storage_message_id = copied_meta
+        except Exception as exc:
+            logging.exception("Failed to copy source video to storage chat: %s", exc)
+            await callback.message.answer("⚠️ Не удалось скопировать видео в vault-канал. Проверьте права бота в канале.")
+    if data.get("file_unique_id") and storage_chat_id and storage_message_id:
+        storage.save_storage_message(row["id"], storage_chat_id, storage_message_id)
 
     await state.clear()
-    await send_video_card(callback.message, row, callback.from_user.id)
-    await callback.message.answer("Готово.", reply_markup=main_menu_kb(can_manage_content(callback.from_user.id if callback.from_user else None)))
+    await send_video_card(callback.message, row, callback.from_user.id, can_manage)
+    await callback.message.answer(status, reply_markup=main_menu_kb(can_manage))
     await callback.answer()
 
 
@@ -487,14 +599,14 @@ async def search_start(message: Message, state: FSMContext) -> None:
 
 
 @dp.message(SearchStates.choose_filter, F.text == BACK)
-async def search_filter_back(message: Message, state: FSMContext) -> None:
-    await go_menu(message, state)
+async def search_filter_back(message: Message, state: FSMContext, can_manage: bool) -> None:
+    await go_menu(message, state, can_manage)
 
 
 @dp.message(SearchStates.choose_filter, F.text == CANCEL)
-async def search_filter_cancel(message: Message, state: FSMContext) -> None:
+async def search_filter_cancel(message: Message, state: FSMContext, can_manage: bool) -> None:
     await state.clear()
-    await message.answer("Поиск отменен.", reply_markup=main_menu_kb(can_manage_content(message.from_user.id if message.from_user else None)))
+    await message.answer("Поиск отменен.", reply_markup=main_menu_kb(can_manage))
 
 
 @dp.message(SearchStates.choose_filter)
@@ -521,12 +633,12 @@ async def search_query_back(message: Message, state: FSMContext) -> None:
 
 
 @dp.message(SearchStates.wait_query, F.text == CANCEL)
-async def search_query_cancel(message: Message, state: FSMContext) -> None:
+async def search_query_cancel(message: Message, state: FSMContext, can_manage: bool) -> None:
     await state.clear()
-    await message.answer("Поиск отменен.", reply_markup=main_menu_kb(can_manage_content(message.from_user.id if message.from_user else None)))
+    await message.answer("Поиск отменен.", reply_markup=main_menu_kb(can_manage))
 
 
-async def send_results(message: Message, user_id: int, mode: str, filter_type: str, query: str, page: int) -> None:
+async def send_results(message: Message, user_id: int, mode: str, filter_type: str, query: str, page: int, edit: bool = False) -> None:
     if mode == "favorites":
         rows, total_pages = storage.favorites(user_id, page)
     elif mode == "all":
@@ -537,7 +649,10 @@ async def send_results(message: Message, user_id: int, mode: str, filter_type: s
         rows, total_pages = storage.search(filter_type, query, page)
 
     if not rows:
-        await message.answer("Ничего не найдено.")
+        if edit:
+            await message.edit_text("Ничего не найдено.")
+        else:
+            await message.answer("Ничего не найдено.")
         return
     lines = [f"Страница {page+1}/{total_pages}"]
     for r in rows:
@@ -545,22 +660,29 @@ async def send_results(message: Message, user_id: int, mode: str, filter_type: s
             lines.append(f"• {r['title']}")
         else:
             lines.append(f"• {r['title']} (id={r['id']})")
-    encoded_query = query.replace(":", "%3A")
     kb_rows = []
     if mode != "titles":
         kb_rows.extend([[InlineKeyboardButton(text=r["title"], callback_data=f"video:open:{r['id']}")] for r in rows])
-    kb_rows.append(pagination_kb(f"list:{mode}:{filter_type}:{encoded_query}", page, total_pages).inline_keyboard[0])
-    await message.answer("\n".join(lines), reply_markup=InlineKeyboardMarkup(inline_keyboard=kb_rows))
+    kb_rows.append(pagination_kb(mode, filter_type, query, page, total_pages).inline_keyboard[0])
+    text = "\n".join(lines)
+    markup = InlineKeyboardMarkup(inline_keyboard=kb_rows)
+    if edit:
+        try:
+            await message.edit_text(text, reply_markup=markup)
+        except TelegramBadRequest:
+            pass  # same page pressed twice: message is not modified
+        return
+    await message.answer(text, reply_markup=markup)
 
 
 @dp.message(SearchStates.wait_query)
-async def search_query(message: Message, state: FSMContext) -> None:
+async def search_query(message: Message, state: FSMContext, can_manage: bool) -> None:
     data = await state.get_data()
     query = (message.text or "").strip()
     if data["filter_type"] == "category":
         if query.startswith("✅ ") or query.startswith("▫️ "):
             query = query[2:].strip()
-        if query not in CATEGORY_OPTIONS:
+        if query not in _CATEGORY_SET:
             await message.answer("Выберите категорию кнопкой из списка.", reply_markup=search_category_kb())
             return
     elif not query:
@@ -572,7 +694,7 @@ async def search_query(message: Message, state: FSMContext) -> None:
         await message.answer("Выберите другую категорию или вернитесь в меню.", reply_markup=search_category_kb())
         return
     await state.clear()
-    await message.answer("Выберите видео или вернитесь в меню.", reply_markup=main_menu_kb(can_manage_content(message.from_user.id if message.from_user else None)))
+    await message.answer("Выберите видео или вернитесь в меню.", reply_markup=main_menu_kb(can_manage))
 
 
 @dp.message(F.text == "📋 Список")
@@ -592,8 +714,8 @@ async def favorites_open(message: Message, state: FSMContext) -> None:
 
 
 @dp.message(F.text == "✏️ Редактировать")
-async def edit_open(message: Message, state: FSMContext) -> None:
-    if not await ensure_manage_access(message, state):
+async def edit_open(message: Message, state: FSMContext, can_manage: bool) -> None:
+    if not await ensure_manage_access(message, state, can_manage):
         return
     await state.set_state(EditStates.wait_video)
     await send_results(message, message.from_user.id, "all", "all", "all", 0)
@@ -601,16 +723,26 @@ async def edit_open(message: Message, state: FSMContext) -> None:
 
 
 @dp.message(F.text == "🗑 Удалить")
-async def delete_open(message: Message, state: FSMContext) -> None:
-    if not await ensure_manage_access(message, state):
+async def delete_open(message: Message, state: FSMContext, can_manage: bool) -> None:
+    if not await ensure_manage_access(message, state, can_manage):
         return
     await state.set_state(DeleteStates.wait_video)
     await send_results(message, message.from_user.id, "all", "all", "all", 0)
     await message.answer("Выберите видео для удаления.", reply_markup=nav_kb())
 
 
+@dp.callback_query(PageCB.filter())
+async def paginate(callback: CallbackQuery, callback_data: PageCB) -> None:
+    mode = _PAGE_MODES[callback_data.mode]
+    filter_type = _PAGE_FILTERS[callback_data.ft]
+    query = callback_data.q.replace("%3A", ":")
+    await send_results(callback.message, callback.from_user.id, mode, filter_type, query, callback_data.page, edit=True)
+    await callback.answer()
+
+
 @dp.callback_query(F.data.startswith("list:"))
-async def paginate(callback: CallbackQuery) -> None:
+async def paginate_legacy(callback: CallbackQuery) -> None:
+    # Keyboards sent before the PageCB switch still carry the old format.
     parts = callback.data.split(":")
     if len(parts) < 6 or parts[-2] != "page":
         await callback.answer("Не удалось открыть страницу", show_alert=True)
@@ -619,21 +751,20 @@ async def paginate(callback: CallbackQuery) -> None:
     filter_type = parts[2]
     query = ":".join(parts[3:-2]).replace("%3A", ":")
     page = parts[-1]
-    await callback.message.delete()
-    await send_results(callback.message, callback.from_user.id, mode, filter_type, query, int(page))
+    await send_results(callback.message, callback.from_user.id, mode, filter_type, query, int(page), edit=True)
     await callback.answer()
 
 
-async def send_video_card(target: Message, row, user_id: int) -> None:
+async def send_video_card(target: Message, row, user_id: int, can_manage: bool) -> None:
     await target.answer(
         video_card_text(storage, row),
-        reply_markup=video_actions_kb(row["id"], storage.is_favorite(user_id, row["id"]), can_manage_content(user_id)),
+        reply_markup=video_actions_kb(row["id"], storage.is_favorite(user_id, row["id"]), can_manage),
     )
 
 
 @dp.callback_query(F.data.startswith("video:open:"))
-async def video_open(callback: CallbackQuery, state: FSMContext) -> None:
-    vid = int(callback.data.split(":")[-1])
+async def video_open(callback: CallbackQuery, state: FSMContext, can_manage: bool) -> None:
+    vid = int(callback.data.rpartition(":")[2])
     row = storage.get_video(vid)
     if not row:
         await callback.answer("Видео не найдено", show_alert=True)
@@ -643,29 +774,45 @@ async def video_open(callback: CallbackQuery, state: FSMContext) -> None:
         await callback.message.answer(video_card_text(storage, row), reply_markup=edit_actions_kb())
         await callback.answer()
         return
-    await send_video_card(callback.message, row, callback.from_user.id)
+    await send_video_card(callback.message, row, callback.from_user.id, can_manage)
     await callback.answer()
 
 
+# (user_id, video_id) -> last toggle time; double-taps inside the window
+# are acknowledged without touching the DB or the keyboard.
+_fav_last_tap: dict[tuple[int, int], float] = {}
+FAV_TAP_WINDOW = 0.5
+
+
 @dp.callback_query(F.data.startswith("video:fav:"))
-async def video_fav(callback: CallbackQuery) -> None:
-    vid = int(callback.data.split(":")[-1])
+async def video_fav(callback: CallbackQuery, can_manage: bool) -> None:
+    vid = int(callback.data.rpartition(":")[2])
+    key = (callback.from_user.id, vid)
+    now = time.monotonic()
+    if now - _fav_last_tap.get(key, 0.0) < FAV_TAP_WINDOW:
+        await callback.answer()
+        return
+    if len(_fav_last_tap) > 4096:
+        _fav_last_tap.clear()
+    _fav_last_tap[key] = now
     new_state = storage.toggle_favorite(callback.from_user.id, vid)
     await callback.answer("Добавлено в избранное" if new_state else "Удалено из избранного")
-    row = storage.get_video(vid)
-    if row:
+    try:
         await callback.message.edit_reply_markup(
             reply_markup=video_actions_kb(
                 vid,
-                storage.is_favorite(callback.from_user.id, vid),
-                can_manage_content(callback.from_user.id if callback.from_user else None),
+                new_state,
+                can_manage,
             )
         )
+    except TelegramBadRequest as exc:
+        if "not modified" not in str(exc):
+            raise
 
 
 @dp.callback_query(F.data.startswith("video:view:"))
 async def video_view(callback: CallbackQuery) -> None:
-    vid = int(callback.data.split(":")[-1])
+    vid = int(callback.data.rpartition(":")[2])
     row = storage.get_video(vid)
     if not row:
         await callback.answer("Видео не найдено", show_alert=True)
@@ -691,10 +838,10 @@ async def video_view(callback: CallbackQuery) -> None:
 
 
 @dp.callback_query(F.data.startswith("video:edit:"))
-async def video_edit(callback: CallbackQuery, state: FSMContext) -> None:
-    if not await ensure_manage_callback_access(callback, state):
+async def video_edit(callback: CallbackQuery, state: FSMContext, can_manage: bool) -> None:
+    if not await ensure_manage_callback_access(callback, state, can_manage):
         return
-    vid = int(callback.data.split(":")[-1])
+    vid = int(callback.data.rpartition(":")[2])
     row = storage.get_video(vid)
     if not row:
         await callback.answer("Видео не найдено", show_alert=True)
@@ -706,40 +853,48 @@ async def video_edit(callback: CallbackQuery, state: FSMContext) -> None:
 
 
 @dp.callback_query(F.data == "edit:title")
-async def edit_title_prompt(callback: CallbackQuery, state: FSMContext) -> None:
-    if not await ensure_manage_callback_access(callback, state):
+async def edit_title_prompt(callback: CallbackQuery, state: FSMContext, can_manage: bool) -> None:
+    if not await ensure_manage_callback_access(callback, state, can_manage):
         return
     await state.update_data(edit_field="title")
     await callback.message.answer("Введите новое название.", reply_markup=nav_kb())
     await callback.answer()
 
 
-@dp.message(EditStates.wait_video)
-async def edit_message_router(message: Message, state: FSMContext) -> None:
-    if not await ensure_manage_access(message, state):
+@dp.message(EditStates.wait_video, F.text == CANCEL)
+async def edit_cancel(message: Message, state: FSMContext, can_manage: bool) -> None:
+    if not await ensure_manage_access(message, state, can_manage):
         return
-    data = await state.get_data()
-    if message.text == CANCEL:
-        await state.clear()
-        await message.answer("Редактирование отменено.", reply_markup=main_menu_kb(can_manage_content(message.from_user.id if message.from_user else None)))
+    await state.clear()
+    await message.answer("Редактирование отменено.", reply_markup=main_menu_kb(can_manage))
+
+
+@dp.message(EditStates.wait_video, F.text == BACK)
+async def edit_back(message: Message, state: FSMContext, can_manage: bool) -> None:
+    if not await ensure_manage_access(message, state, can_manage):
         return
-    if message.text == BACK:
-        await state.clear()
-        await message.answer("Назад в меню.", reply_markup=main_menu_kb(can_manage_content(message.from_user.id if message.from_user else None)))
+    await state.clear()
+    await message.answer("Назад в меню.", reply_markup=main_menu_kb(can_manage))
+
+
+@dp.message(EditStates.wait_video)
+async def edit_message_router(message: Message, state: FSMContext, can_manage: bool) -> None:
+    if not await ensure_manage_access(message, state, can_manage):
         return
+    data = await state.get_data()
     if data.get("edit_field") == "title":
         title = (message.text or "").strip()
         if not title:
             await message.answer("Пустое название нельзя.")
             return
         storage.update_title(data["edit_video_id"], title)
-        await message.answer("Название обновлено.", reply_markup=main_menu_kb(can_manage_content(message.from_user.id if message.from_user else None)))
+        await message.answer("Название обновлено.", reply_markup=main_menu_kb(can_manage))
         await state.clear()
 
 
 @dp.callback_query(F.data == "edit:delete")
-async def edit_delete(callback: CallbackQuery, state: FSMContext) -> None:
-    if not await ensure_manage_callback_access(callback, state):
+async def edit_delete(callback: CallbackQuery, state: FSMContext, can_manage: bool) -> None:
+    if not await ensure_manage_callback_access(callback, state, can_manage):
         return
     data = await state.get_data()
     vid = data.get("edit_video_id")
@@ -758,11 +913,11 @@ async def edit_delete(callback: CallbackQuery, state: FSMContext) -> None:
 
 
 @dp.callback_query(F.data.startswith("video:delete:"))
-async def delete_preview(callback: CallbackQuery) -> None:
-    if not can_manage_content(callback.from_user.id if callback.from_user else None):
+async def delete_preview(callback: CallbackQuery, can_manage: bool) -> None:
+    if not can_manage:
         await callback.answer("Только чтение", show_alert=True)
         return
-    vid = int(callback.data.split(":")[-1])
+    vid = int(callback.data.rpartition(":")[2])
     row = storage.get_video(vid)
     if not row:
         await callback.answer("Видео не найдено", show_alert=True)
@@ -778,44 +933,124 @@ async def delete_preview(callback: CallbackQuery) -> None:
 
 
 @dp.callback_query(F.data.startswith("del:confirm:"))
-async def delete_confirm(callback: CallbackQuery, state: FSMContext) -> None:
-    if not await ensure_manage_callback_access(callback, state):
+async def delete_confirm(callback: CallbackQuery, state: FSMContext, can_manage: bool) -> None:
+    if not await ensure_manage_callback_access(callback, state, can_manage):
         return
-    vid = int(callback.data.split(":")[-1])
+    vid = int(callback.data.rpartition(":")[2])
     storage.delete_video(vid)
     await state.clear()
-    await callback.message.answer("Видео удалено.", reply_markup=main_menu_kb(can_manage_content(callback.from_user.id if callback.from_user else None)))
+    await callback.message.answer("Видео удалено.", reply_markup=main_menu_kb(can_manage))
     await callback.answer()
 
 
 @dp.callback_query(F.data == "del:cancel")
-async def delete_cancel(callback: CallbackQuery, state: FSMContext) -> None:
+async def delete_cancel(callback: CallbackQuery, state: FSMContext, can_manage: bool) -> None:
     await state.clear()
-    await callback.message.answer("Удаление отменено.", reply_markup=main_menu_kb(can_manage_content(callback.from_user.id if callback.from_user else None)))
+    await callback.message.answer("Удаление отменено.", reply_markup=main_menu_kb(can_manage))
     await callback.answer()
 
 
+# Vault refreshes queued for a debounced flush: bulk uploads become one
+# transaction instead of one commit per channel post.
+_refresh_buffer: list[tuple[int, str, str]] = []
+_refresh_flush_task: asyncio.Task | None = None
+REFRESH_FLUSH_DELAY = 0.25
+
+
+async def _flush_refresh_buffer() -> None:
+    global _refresh_flush_task
+    await asyncio.sleep(REFRESH_FLUSH_DELAY)
+    batch, _refresh_buffer[:] = _refresh_buffer[:], []
+    _refresh_flush_task = None
+    if not batch:
+        return
+    touched = storage.refresh_file_ids_from_storage(batch)
+    logging.info("Storage refresh applied: %s posts, %s rows", len(batch), touched)
+
+
 @dp.channel_post(F.video)
 async def vault_channel_post(message: Message) -> None:
+    global _refresh_flush_task
     if not STORAGE_CHAT_ID or message.chat.id != STORAGE_CHAT_ID or not message.video:
         return
-    updated = storage.refresh_file_id_from_storage(
-        message.message_id,
-        message.video.file_id,
-        message.video.file_unique_id,
+    _refresh_buffer.append(
+        (message.message_id, message.video.file_id, message.video.file_unique_id)
     )
-    if updated:
-        logging.info("Storage refresh applied for storage_message_id=%s", message.message_id)
+    if _refresh_flush_task is None:
+        _refresh_flush_task = asyncio.create_task(_flush_refresh_buffer())
 
 
-async def main() -> None:
+def setup_logging() -> QueueListener:
+    """Route log records through a queue so formatting and I/O happen off-loop."""
     logging.basicConfig(level=logging.INFO)
+    root = logging.getLogger()
+    log_queue: queue.Queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    root.handlers = [QueueHandler(log_queue)]
+    listener.start()
+    return listener
+
+
+async def _periodic_db_optimize() -> None:
+    # Refresh planner statistics every few hours so a long-lived process
+    # doesn't run weeks on stale sqlite_stat1; close() covers shutdown.
+    while True:
+        await asyncio.sleep(6 * 3600)
+        for conn in (storage.conn, users_storage.conn):
+            conn.execute("PRAGMA analysis_limit=1000")
+            conn.execute("PRAGMA optimize")
+
+
+async def main() -> None:
+    setup_logging()
+    storage.ensure_taxonomy()
     token = os.getenv("BOT_TOKEN")
     if not token:
         raise RuntimeError("BOT_TOKEN is not set")
-    bot = Bot(token)
-    await dp.start_polling(bot, admin_ids=ADMIN_IDS, users_storage=users_storage)
+    # 200 pooled connections so bursts of answer/edit_text calls don't queue
+    # behind connection setup (aiogram's default pool is 100; DNS caching is
+    # already on in AiohttpSession).
+    bot = Bot(token, session=AiohttpSession(limit=200))
+    webhook_url = os.getenv("WEBHOOK_URL")
+    optimize_task = asyncio.create_task(_periodic_db_optimize())
+    try:
+        if webhook_url:
+            await run_webhook(bot, webhook_url)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        optimize_task.cancel()
+        storage.close()
+        users_storage.close()
+
+
+async def run_webhook(bot: Bot, webhook_url: str) -> None:
+    """Serve updates over an aiohttp webhook instead of getUpdates polling."""
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+    from aiohttp import web
+
+    host = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    port = int(os.getenv("WEBHOOK_PORT", "8080"))
+    path = os.getenv("WEBHOOK_PATH", "/tg")
+    await bot.set_webhook(
+        url=webhook_url.rstrip("/") + path,
+        allowed_updates=["message", "callback_query", "channel_post"],
+        max_connections=100,
+    )
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    await asyncio.Event().wait()
 
 
 if __name__ == "__main__":
+    try:
+        import uvloop
+    except ModuleNotFoundError:
+        uvloop = None
+    if uvloop is not None:
+        uvloop.install()
     asyncio.run(main())
@@ -1,10 +1,22 @@
+import json
+import logging
 import re
 import sqlite3
+import time
+from functools import lru_cache
 from math import ceil
 from typing import Iterable, Optional
 import os
 
 PAGE_SIZE = 10
+# Bump when CATEGORY_OPTIONS (or other seeded data) changes so ensure_taxonomy reruns.
+SCHEMA_VERSION = 2
+VIDEO_CACHE_TTL = 2.0
+VIDEO_CACHE_MAX = 1024
+FAV_CACHE_TTL = 60.0
+FAV_CACHE_MAX = 4096
+CAT_CACHE_TTL = 60.0
+CAT_CACHE_MAX = 4096
 TITLE_LIST_PAGE_SIZE = 15
 CATEGORY_OPTIONS = [
     "Вайны",
@@ -18,22 +30,54 @@ CATEGORY_OPTIONS = [
 ]
 
 
+log = logging.getLogger(__name__)
+
+_SCHEME_RE = re.compile(r"^https?://")
+
+
+@lru_cache(maxsize=4096)
 def normalize_url(url: str | None) -> str | None:
     if not url:
         return None
     u = url.strip().lower()
-    u = re.sub(r"^https?://", "", u)
+    u = _SCHEME_RE.sub("", u)
     return u.rstrip("/")
 
 class Storage:
     def __init__(self, path: Optional[str] = None) -> None:
         if path is None:
             path = os.getenv("DB_PATH", "/app/data/dancehall.db")
-            print(f"[DB] Using DB_PATH={path}")
-        self.conn = sqlite3.connect(path)
+            log.info("Using DB_PATH=%s", path)
+        self.conn = sqlite3.connect(path, check_same_thread=False, cached_statements=256)
         self.conn.row_factory = sqlite3.Row
+        # video_id -> (monotonic fetch time, row); short TTL to absorb the
+        # repeated get_video calls within one user interaction.
+        self._video_cache: dict[int, tuple[float, sqlite3.Row]] = {}
+        # (user_id, video_id) -> (fetch time, flag); toggles invalidate.
+        self._fav_cache: dict[tuple[int, int], tuple[float, bool]] = {}
+        # video_id -> (fetch time, names); category edits invalidate.
+        self._cat_cache: dict[int, tuple[float, list[str]]] = {}
+        self._videos_rebuilt = False
+        self._apply_pragmas()
         self._init_db()
 
+    def _apply_pragmas(self) -> None:
+        # WAL + synchronous=NORMAL keep reads unblocked by writes and cut
+        # fsyncs per commit, so storage calls stall the event loop less.
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA cache_size=-20000")
+        self.conn.execute("PRAGMA mmap_size=268435456")
+
+    def close(self) -> None:
+        # PRAGMA optimize runs ANALYZE only where the planner expects a win,
+        # keeping join plans accurate as the tables grow; cheap on small DBs.
+        self.conn.execute("PRAGMA analysis_limit=1000")
+        self.conn.execute("PRAGMA optimize")
+        self.conn.close()
+
     def _init_db(self) -> None:
         cur = self.conn.cursor()
         cur.execute("PRAGMA foreign_keys = ON;")
@@ -41,7 +85,7 @@ class Storage:
         cur.executescript(
             """
             CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                id INTEGER PRIMARY KEY,
                 name TEXT NOT NULL UNIQUE
             );
             CREATE TABLE IF NOT EXISTS video_categories (
@@ -57,64 +101,91 @@ class Storage:
                 PRIMARY KEY(user_id, video_id),
                 FOREIGN KEY(video_id) REFERENCES videos(id) ON DELETE CASCADE
             );
-            DROP TABLE IF EXISTS video_tags;
-            DROP TABLE IF EXISTS tags;
+            CREATE INDEX IF NOT EXISTS idx_vc_cat ON video_categories(category_id, video_id);
+            CREATE INDEX IF NOT EXISTS idx_fav_video ON favorites(video_id);
+            CREATE INDEX IF NOT EXISTS idx_videos_title_nocase ON videos(title COLLATE NOCASE);
+            CREATE INDEX IF NOT EXISTS ix_videos_file_unique_id ON videos(file_unique_id);
+            CREATE INDEX IF NOT EXISTS ix_videos_storage_message_id ON videos(storage_message_id);
+            CREATE INDEX IF NOT EXISTS ix_videos_vault_message_id ON videos(vault_message_id);
             """
         )
-        self._repair_relations_after_video_rebuild()
+        # Legacy tags tables are dropped once per migration, not on every
+        # start: user_version is stamped by ensure_taxonomy, so a hot restart
+        # skips the schema-write transaction entirely.
+        if cur.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            cur.executescript("DROP TABLE IF EXISTS video_tags; DROP TABLE IF EXISTS tags;")
+        self._ensure_categories_json_column()
+        self._ensure_title_fts()
         self.conn.commit()
 
 
-    def _repair_relations_after_video_rebuild(self) -> None:
-        video_categories_sql = self._table_sql("video_categories")
-        favorites_sql = self._table_sql("favorites")
-        needs_video_categories_fix = video_categories_sql and "videos_old" in video_categories_sql.lower()
-        needs_favorites_fix = favorites_sql and "videos_old" in favorites_sql.lower()
-        if not needs_video_categories_fix and not needs_favorites_fix:
+    def _ensure_categories_json_column(self) -> None:
+        """Add the denormalized category list to videos and backfill it once."""
+        if "categories_json" in self._get_video_columns():
+            self._repair_empty_categories_json()
             return
-
-        print(
-            "[DB] repairing relation tables after videos rebuild: "
-            f"video_categories={needs_video_categories_fix}, favorites={needs_favorites_fix}"
-        )
-
-        if needs_video_categories_fix:
-            self.conn.executescript(
-                """
-                CREATE TABLE video_categories_new (
-                    video_id INTEGER NOT NULL,
-                    category_id INTEGER NOT NULL,
-                    PRIMARY KEY(video_id, category_id),
-                    FOREIGN KEY(video_id) REFERENCES videos(id) ON DELETE CASCADE,
-                    FOREIGN KEY(category_id) REFERENCES categories(id) ON DELETE CASCADE
-                );
-                INSERT OR IGNORE INTO video_categories_new(video_id, category_id)
-                SELECT vc.video_id, vc.category_id
-                  FROM video_categories vc
-                  JOIN videos v ON v.id = vc.video_id
-                  JOIN categories c ON c.id = vc.category_id;
-                DROP TABLE video_categories;
-                ALTER TABLE video_categories_new RENAME TO video_categories;
-                """
+        log.info("adding videos.categories_json and backfilling from video_categories")
+        self.conn.execute("ALTER TABLE videos ADD COLUMN categories_json TEXT NOT NULL DEFAULT '[]'")
+        self._backfill_categories_json()
+
+    def _repair_empty_categories_json(self) -> None:
+        # Databases migrated before the rebuild learned to backfill carry
+        # '[]' for videos that still have links; one probe detects them.
+        damaged = self.conn.execute(
+            """
+            SELECT EXISTS(
+                SELECT 1 FROM video_categories vc
+                JOIN videos v ON v.id = vc.video_id
+                WHERE v.categories_json = '[]'
             )
+            """
+        ).fetchone()[0]
+        if not damaged:
+            return
+        log.info("repairing empty categories_json for videos with category links")
+        self._backfill_categories_json()
 
-        if needs_favorites_fix:
-            self.conn.executescript(
-                """
-                CREATE TABLE favorites_new (
-                    user_id INTEGER NOT NULL,
-                    video_id INTEGER NOT NULL,
-                    PRIMARY KEY(user_id, video_id),
-                    FOREIGN KEY(video_id) REFERENCES videos(id) ON DELETE CASCADE
-                );
-                INSERT OR IGNORE INTO favorites_new(user_id, video_id)
-                SELECT f.user_id, f.video_id
-                  FROM favorites f
-                  JOIN videos v ON v.id = f.video_id;
-                DROP TABLE favorites;
-                ALTER TABLE favorites_new RENAME TO favorites;
-                """
+    def _backfill_categories_json(self) -> None:
+        self.conn.execute(
+            """
+            UPDATE videos SET categories_json = COALESCE(
+                (SELECT json_group_array(name) FROM (
+                    SELECT c.name AS name FROM categories c
+                    JOIN video_categories vc ON vc.category_id = c.id
+                    WHERE vc.video_id = videos.id
+                    ORDER BY c.name
+                )),
+                '[]'
             )
+            """
+        )
+
+    def _ensure_title_fts(self) -> None:
+        """Inverted index over titles; substring LIKE scans the whole table."""
+        existed = self._table_sql("videos_fts") is not None
+        self.conn.executescript(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5(
+                title,
+                content='videos',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS trg_videos_fts_ai AFTER INSERT ON videos BEGIN
+                INSERT INTO videos_fts(rowid, title) VALUES (new.id, new.title);
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_videos_fts_ad AFTER DELETE ON videos BEGIN
+                INSERT INTO videos_fts(videos_fts, rowid, title) VALUES ('delete', old.id, old.title);
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_videos_fts_au AFTER UPDATE OF title ON videos BEGIN
+                INSERT INTO videos_fts(videos_fts, rowid, title) VALUES ('delete', old.id, old.title);
+                INSERT INTO videos_fts(rowid, title) VALUES (new.id, new.title);
+            END;
+            """
+        )
+        if not existed or self._videos_rebuilt:
+            log.info("rebuilding videos_fts title index")
+            self.conn.execute("INSERT INTO videos_fts(videos_fts) VALUES('rebuild')")
 
     def _table_sql(self, table_name: str) -> str | None:
         row = self.conn.execute(
@@ -126,7 +197,7 @@ class Storage:
     def ensure_videos_schema(self) -> None:
         self._ensure_db_health()
         if not self._videos_table_exists():
-            print("[DB] videos table not found, creating fresh schema")
+            log.info("videos table not found, creating fresh schema")
             self._create_videos_table()
             self.conn.commit()
             return
@@ -144,15 +215,14 @@ class Storage:
             for idx in indexes
         )
 
-        print(
-            f"[DB] videos schema check: columns={sorted(columns)} indexes={indexes}"
-        )
+        log.debug("videos schema check: columns=%s indexes=%s", sorted(columns), indexes)
         needs_migration = not (has_unique_vault_pair and not has_unique_file_unique_id and has_vault_cols)
-        print(
-            "[DB] videos migration required="
-            f"{needs_migration} (has_vault_cols={has_vault_cols}, "
-            f"has_unique_file_unique_id={has_unique_file_unique_id}, "
-            f"has_unique_vault_pair={has_unique_vault_pair})"
+        log.info(
+            "videos migration required=%s (has_vault_cols=%s, has_unique_file_unique_id=%s, has_unique_vault_pair=%s)",
+            needs_migration,
+            has_vault_cols,
+            has_unique_file_unique_id,
+            has_unique_vault_pair,
         )
         if not needs_migration:
             return
@@ -161,10 +231,14 @@ class Storage:
 
     def _ensure_db_health(self) -> None:
         self.conn.execute("SELECT 1").fetchone()
+        # integrity_check reads the whole file — multi-second on big DBs —
+        # so the full scan is opt-in; the SELECT 1 probe always runs.
+        if os.getenv("DB_INTEGRITY_CHECK") != "1":
+            return
         integrity = self.conn.execute("PRAGMA integrity_check").fetchone()
         result = (integrity[0] if integrity else "").lower()
         if result != "ok":
-            print(f"[DB] integrity_check failed: {result}")
+            log.error("integrity_check failed: %s", result)
             raise RuntimeError("SQLite integrity check failed; aborting schema migration")
 
     def _videos_table_exists(self) -> bool:
@@ -177,20 +251,29 @@ class Storage:
         return {row["name"] for row in self.conn.execute("PRAGMA table_info(videos)").fetchall()}
 
     def _get_video_indexes(self) -> list[dict]:
-        data = []
-        for idx in self.conn.execute("PRAGMA index_list(videos)").fetchall():
-            cols = [
-                r["name"]
-                for r in self.conn.execute(f"PRAGMA index_info('{idx['name']}')").fetchall()
-            ]
-            data.append({"name": idx["name"], "unique": bool(idx["unique"]), "columns": cols})
+        # One statement instead of 1 + one PRAGMA per index: the pragma
+        # table-valued functions join on the index name.
+        rows = self.conn.execute(
+            """
+            SELECT il.name AS idx, il."unique" AS uniq, ii.name AS col
+              FROM pragma_index_list('videos') il, pragma_index_info(il.name) ii
+             ORDER BY il.seq, ii.seqno
+            """
+        ).fetchall()
+        data: list[dict] = []
+        for r in rows:
+            if not data or data[-1]["name"] != r["idx"]:
+                data.append({"name": r["idx"], "unique": bool(r["uniq"]), "columns": []})
+            data[-1]["columns"].append(r["col"])
         return data
 
-    def _create_videos_table(self) -> None:
-        self.conn.executescript(
-            """
-            CREATE TABLE IF NOT EXISTS videos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+    def _create_videos_table(self, name: str = "videos") -> None:
+        # The vault-pair uniqueness is an inline constraint so the table is
+        # self-contained under any name during a rebuild swap.
+        self.conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {name} (
+                id INTEGER PRIMARY KEY,
                 title TEXT NOT NULL,
                 file_id TEXT,
                 file_unique_id TEXT,
@@ -201,16 +284,25 @@ class Storage:
                 storage_message_id INTEGER,
                 needs_refresh INTEGER NOT NULL DEFAULT 0,
                 vault_chat_id INTEGER,
-                vault_message_id INTEGER
-            );
-            CREATE UNIQUE INDEX IF NOT EXISTS ux_videos_vault_pair
-              ON videos(vault_chat_id, vault_message_id);
+                vault_message_id INTEGER,
+                categories_json TEXT NOT NULL DEFAULT '[]',
+                UNIQUE(vault_chat_id, vault_message_id)
+            )
+            """
+        )
+        if name == "videos":
+            self._create_videos_indexes()
+
+    def _create_videos_indexes(self) -> None:
+        self.conn.executescript(
+            """
             CREATE INDEX IF NOT EXISTS ix_videos_created_at ON videos(created_at);
             CREATE INDEX IF NOT EXISTS ix_videos_vault_chat_id ON videos(vault_chat_id);
             """
         )
 
     def _rebuild_videos_table(self) -> None:
+        self._videos_rebuilt = True
         rows_before = self.conn.execute("SELECT COUNT(*) AS cnt FROM videos").fetchone()["cnt"]
         source_columns = self._get_video_columns()
         vault_chat_expr = "COALESCE(vault_chat_id, storage_chat_id)" if "vault_chat_id" in source_columns else "storage_chat_id"
@@ -219,48 +311,67 @@ class Storage:
             if "vault_message_id" in source_columns
             else "storage_message_id"
         )
-        print(f"[DB] rebuilding videos table, rows_before={rows_before}")
+        categories_json_expr = "categories_json" if "categories_json" in source_columns else "'[]'"
+        log.info("rebuilding videos table, rows_before=%s", rows_before)
         fk_row = self.conn.execute("PRAGMA foreign_keys").fetchone()
         fk_enabled = bool(fk_row[0]) if fk_row else True
         try:
             if fk_enabled:
                 self.conn.execute("PRAGMA foreign_keys = OFF")
             self.conn.execute("BEGIN IMMEDIATE")
-            self.conn.execute("ALTER TABLE videos RENAME TO videos_old")
-            self._create_videos_table()
+            # Create-new + swap (the documented rebuild recipe): the old table
+            # keeps its name until the very end, so FK clauses in
+            # video_categories/favorites never get rewritten to a temp name.
+            self._create_videos_table("videos_new")
             self.conn.execute(
                 """
-                INSERT OR IGNORE INTO videos(
+                INSERT OR IGNORE INTO videos_new(
                     id, title, file_id, file_unique_id, source_url, source_url_normalized,
                     created_at, storage_chat_id, storage_message_id, needs_refresh,
-                    vault_chat_id, vault_message_id
+                    vault_chat_id, vault_message_id, categories_json
                 )
                 SELECT
                     id, title, file_id, file_unique_id, source_url, source_url_normalized,
                     created_at, storage_chat_id, storage_message_id,
                     COALESCE(needs_refresh, 0),
                     {vault_chat_expr},
-                    {vault_message_expr}
-                FROM videos_old
+                    {vault_message_expr},
+                    {categories_json_expr}
+                FROM videos
                 """.format(
                     vault_chat_expr=vault_chat_expr,
                     vault_message_expr=vault_message_expr,
+                    categories_json_expr=categories_json_expr,
                 )
             )
-            inserted_rows = self.conn.execute("SELECT COUNT(*) AS cnt FROM videos").fetchone()["cnt"]
+            inserted_rows = self.conn.execute("SELECT COUNT(*) AS cnt FROM videos_new").fetchone()["cnt"]
             skipped_rows = rows_before - inserted_rows
-            self.conn.execute("DROP TABLE videos_old")
+            self.conn.execute("DROP TABLE videos")
+            self.conn.execute("ALTER TABLE videos_new RENAME TO videos")
+            self._create_videos_indexes()
+            # Rows skipped by OR IGNORE can leave dangling links behind.
+            for table in ("video_categories", "favorites"):
+                if self._table_sql(table):
+                    self.conn.execute(
+                        f"DELETE FROM {table} WHERE video_id NOT IN (SELECT id FROM videos)"
+                    )
+            if categories_json_expr != "categories_json" and self._table_sql("video_categories"):
+                # The source table had no categories_json, so the copy wrote
+                # '[]' everywhere; rebuild it from the surviving links before
+                # the later column check sees the column as already present.
+                self._backfill_categories_json()
             self.conn.execute("COMMIT")
-            print(
-                "[DB] videos rebuild complete: "
-                f"inserted_rows={inserted_rows}, skipped_rows={skipped_rows}"
+            log.info(
+                "videos rebuild complete: inserted_rows=%s, skipped_rows=%s",
+                inserted_rows,
+                skipped_rows,
             )
         except Exception as exc:
             try:
                 self.conn.execute("ROLLBACK")
             except sqlite3.OperationalError:
                 pass
-            print(f"[DB] videos rebuild failed, rolled back: {exc}")
+            log.error("videos rebuild failed, rolled back: %s", exc)
             raise
         finally:
             if fk_enabled:
@@ -277,19 +388,26 @@ class Storage:
             for idx in final_indexes
         )
         rows_after = self.conn.execute("SELECT COUNT(*) AS cnt FROM videos").fetchone()["cnt"]
-        print(
-            f"[DB] videos post-check: rows_after={rows_after}, indexes={final_indexes}, "
-            f"has_unique_vault_pair={has_unique_vault_pair}, "
-            f"has_unique_file_unique_id={has_unique_file_unique_id}"
+        log.debug(
+            "videos post-check: rows_after=%s, indexes=%s, has_unique_vault_pair=%s, has_unique_file_unique_id=%s",
+            rows_after,
+            final_indexes,
+            has_unique_vault_pair,
+            has_unique_file_unique_id,
         )
         if not has_unique_vault_pair or has_unique_file_unique_id:
             raise RuntimeError("videos schema post-check failed")
 
     def ensure_taxonomy(self) -> None:
-        for name in CATEGORY_OPTIONS:
-            self.conn.execute("INSERT OR IGNORE INTO categories(name) VALUES(?)", (name,))
-        self.conn.execute("DELETE FROM categories WHERE name = ?", ("Другое",))
-        self.conn.commit()
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO categories(name) VALUES(?)",
+                [(name,) for name in CATEGORY_OPTIONS],
+            )
+            self.conn.execute("DELETE FROM categories WHERE name = ?", ("Другое",))
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
     def find_video_by_file_uid(self, uid: str):
         return self.conn.execute(
@@ -314,35 +432,57 @@ class Storage:
         ).fetchone()
 
     def find_video_by_title(self, title: str):
-        return self.conn.execute("SELECT * FROM videos WHERE lower(title) = lower(?)", (title.strip(),)).fetchone()
+        return self.conn.execute(
+            "SELECT * FROM videos WHERE title = ? COLLATE NOCASE", (title.strip(),)
+        ).fetchone()
 
     def create_video(self, title, file_id, file_unique_id, source_url, categories):
         normalized_url = normalize_url(source_url) if source_url else None
-        cur = self.conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO videos(title, file_id, file_unique_id, source_url, source_url_normalized)
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            (title.strip(), file_id, file_unique_id, source_url, normalized_url),
-        )
-        vid = cur.lastrowid
-        self._set_categories(vid, categories)
-        self.conn.commit()
+        with self.conn:
+            cur = self.conn.execute(
+                """
+                INSERT INTO videos(title, file_id, file_unique_id, source_url, source_url_normalized)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (title.strip(), file_id, file_unique_id, source_url, normalized_url),
+            )
+            vid = cur.lastrowid
+            self._set_categories(vid, categories)
         return vid
 
+    def create_videos(self, items) -> list[int]:
+        """Bulk ingest: one transaction (one fsync) for a whole batch.
+
+        items: iterable of (title, file_id, file_unique_id, source_url, categories).
+        """
+        ids: list[int] = []
+        with self.conn:
+            for title, file_id, file_unique_id, source_url, categories in items:
+                normalized_url = normalize_url(source_url) if source_url else None
+                cur = self.conn.execute(
+                    """
+                    INSERT INTO videos(title, file_id, file_unique_id, source_url, source_url_normalized)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (title.strip(), file_id, file_unique_id, source_url, normalized_url),
+                )
+                self._set_categories(cur.lastrowid, categories)
+                ids.append(cur.lastrowid)
+        return ids
+
     def replace_video(self, video_id, title, file_id, file_unique_id, source_url, categories):
         normalized_url = normalize_url(source_url) if source_url else None
-        self.conn.execute(
-            """
-            UPDATE videos
-               SET title = ?, file_id = ?, file_unique_id = ?, source_url = ?, source_url_normalized = ?
-             WHERE id = ?
-            """,
-            (title.strip(), file_id, file_unique_id, source_url, normalized_url, video_id),
-        )
-        self._set_categories(video_id, categories)
-        self.conn.commit()
+        with self.conn:
+            self.conn.execute(
+                """
+                UPDATE videos
+                   SET title = ?, file_id = ?, file_unique_id = ?, source_url = ?, source_url_normalized = ?
+                 WHERE id = ?
+                """,
+                (title.strip(), file_id, file_unique_id, source_url, normalized_url, video_id),
+            )
+            self._set_categories(video_id, categories)
+        self._invalidate_video(video_id)
 
     def upsert_video_file(self, title, file_id, file_unique_id, source_url):
         normalized_url = normalize_url(source_url) if source_url else None
@@ -358,6 +498,21 @@ class Storage:
         self.conn.commit()
         return row_id
 
+    def upsert_video_file_with_categories(self, title, file_id, file_unique_id, source_url, categories) -> int:
+        """Insert a file-backed video and its categories in one transaction (one fsync)."""
+        normalized_url = normalize_url(source_url) if source_url else None
+        with self.conn:
+            cur = self.conn.execute(
+                """
+                INSERT INTO videos(title, file_id, file_unique_id, source_url, source_url_normalized, needs_refresh)
+                VALUES (?, ?, ?, ?, ?, 0)
+                """,
+                (title.strip(), file_id, file_unique_id, source_url, normalized_url),
+            )
+            vid = cur.lastrowid
+            self._set_categories(vid, categories)
+        return vid
+
     def upsert_video_by_vault(self, title, file_id, file_unique_id, source_url, vault_chat_id, vault_message_id):
         normalized_url = normalize_url(source_url) if source_url else None
         cur = self.conn.cursor()
@@ -377,6 +532,7 @@ class Storage:
                 needs_refresh = 0,
                 storage_chat_id = excluded.storage_chat_id,
                 storage_message_id = excluded.storage_message_id
+            RETURNING id
             """,
             (
                 title.strip(),
@@ -390,10 +546,7 @@ class Storage:
                 vault_message_id,
             ),
         )
-        row = self.conn.execute(
-            "SELECT id FROM videos WHERE vault_chat_id = ? AND vault_message_id = ?",
-            (vault_chat_id, vault_message_id),
-        ).fetchone()
+        row = cur.fetchone()
         self.conn.commit()
         return int(row["id"])
 
@@ -407,6 +560,7 @@ class Storage:
             (storage_chat_id, storage_message_id, video_id),
         )
         self.conn.commit()
+        self._invalidate_video(video_id)
 
     def save_vault_message(self, video_id: int, vault_chat_id: int, vault_message_id: int) -> None:
         self.conn.execute(
@@ -418,6 +572,7 @@ class Storage:
             (vault_chat_id, vault_message_id, vault_chat_id, vault_message_id, video_id),
         )
         self.conn.commit()
+        self._invalidate_video(video_id)
 
     def refresh_file_id_from_storage(self, storage_message_id: int, file_id: str, file_unique_id: str) -> int | None:
         updated = self.conn.execute(
@@ -430,6 +585,7 @@ class Storage:
         )
         if updated.rowcount:
             self.conn.commit()
+            self._video_cache.clear()
             return updated.rowcount
 
         fallback = self.conn.execute(
@@ -441,30 +597,84 @@ class Storage:
             (file_id, file_unique_id),
         )
         self.conn.commit()
+        if fallback.rowcount:
+            self._video_cache.clear()
         return fallback.rowcount if fallback.rowcount else None
 
+    def refresh_file_ids_from_storage(self, items: Iterable[tuple[int, str, str]]) -> int:
+        """Apply a batch of vault refreshes in one transaction; returns rows touched."""
+        touched = 0
+        with self.conn:
+            for storage_message_id, file_id, file_unique_id in items:
+                cur = self.conn.execute(
+                    """
+                    UPDATE videos
+                       SET file_id = ?, file_unique_id = ?, needs_refresh = 0
+                     WHERE storage_message_id = ?
+                    """,
+                    (file_id, file_unique_id, storage_message_id),
+                )
+                if not cur.rowcount:
+                    cur = self.conn.execute(
+                        """
+                        UPDATE videos
+                           SET file_id = ?, needs_refresh = 0
+                         WHERE file_unique_id = ?
+                        """,
+                        (file_id, file_unique_id),
+                    )
+                touched += cur.rowcount
+        if touched:
+            self._video_cache.clear()
+        return touched
+
     def mark_needs_refresh(self, video_id: int) -> None:
         self.conn.execute("UPDATE videos SET needs_refresh = 1 WHERE id = ?", (video_id,))
         self.conn.commit()
+        self._invalidate_video(video_id)
 
     def _set_categories(self, video_id: int, categories: Iterable[str]) -> None:
+        categories = [c.strip() for c in categories]
         self.conn.execute("DELETE FROM video_categories WHERE video_id = ?", (video_id,))
-        for c in categories:
-            cid = self._ensure_entity("categories", c)
-            self.conn.execute(
-                "INSERT OR IGNORE INTO video_categories(video_id, category_id) VALUES(?, ?)",
-                (video_id, cid),
+        if categories:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO categories(name) VALUES(?)",
+                [(c,) for c in categories],
             )
+            self.conn.executemany(
+                """
+                INSERT OR IGNORE INTO video_categories(video_id, category_id)
+                SELECT ?, id FROM categories WHERE name = ?
+                """,
+                [(video_id, c) for c in categories],
+            )
+        self.conn.execute(
+            "UPDATE videos SET categories_json = ? WHERE id = ?",
+            (json.dumps(sorted(categories), ensure_ascii=False), video_id),
+        )
+        self._invalidate_video(video_id)
 
-    def _ensure_entity(self, table: str, name: str) -> int:
-        self.conn.execute(f"INSERT OR IGNORE INTO {table}(name) VALUES(?)", (name.strip(),))
-        row = self.conn.execute(f"SELECT id FROM {table} WHERE name = ?", (name.strip(),)).fetchone()
-        return int(row["id"])
+    def _invalidate_video(self, video_id: int) -> None:
+        self._video_cache.pop(video_id, None)
+        self._cat_cache.pop(video_id, None)
 
     def get_video(self, video_id: int):
-        return self.conn.execute("SELECT * FROM videos WHERE id = ?", (video_id,)).fetchone()
+        cached = self._video_cache.get(video_id)
+        if cached is not None and time.monotonic() - cached[0] < VIDEO_CACHE_TTL:
+            return cached[1]
+        row = self.conn.execute("SELECT * FROM videos WHERE id = ?", (video_id,)).fetchone()
+        if row is not None:
+            if len(self._video_cache) >= VIDEO_CACHE_MAX:
+                self._video_cache.clear()
+            self._video_cache[video_id] = (time.monotonic(), row)
+        else:
+            self._video_cache.pop(video_id, None)
+        return row
 
     def video_categories(self, video_id: int) -> list[str]:
+        cached = self._cat_cache.get(video_id)
+        if cached is not None and time.monotonic() - cached[0] < CAT_CACHE_TTL:
+            return cached[1]
         rows = self.conn.execute(
             """
             SELECT c.name FROM categories c
@@ -474,60 +684,115 @@ class Storage:
             """,
             (video_id,),
         ).fetchall()
-        return [r["name"] for r in rows]
+        names = [r["name"] for r in rows]
+        if len(self._cat_cache) >= CAT_CACHE_MAX:
+            self._cat_cache.clear()
+        self._cat_cache[video_id] = (time.monotonic(), names)
+        return names
+
+    def categories_for_ids(self, ids: Iterable[int]) -> dict[int, list[str]]:
+        """Category names for a whole page of videos in one IN-query."""
+        ids = list(ids)
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        rows = self.conn.execute(
+            f"""
+            SELECT vc.video_id, c.name FROM categories c
+            JOIN video_categories vc ON vc.category_id = c.id
+            WHERE vc.video_id IN ({placeholders})
+            ORDER BY c.name
+            """,
+            ids,
+        ).fetchall()
+        result: dict[int, list[str]] = {}
+        for r in rows:
+            result.setdefault(r["video_id"], []).append(r["name"])
+        return result
+
+    def favorites_for_ids(self, user_id: int, ids: Iterable[int]) -> set[int]:
+        """Subset of the given video ids the user has favorited, in one IN-query."""
+        ids = list(ids)
+        if not ids:
+            return set()
+        placeholders = ",".join("?" * len(ids))
+        rows = self.conn.execute(
+            f"SELECT video_id FROM favorites WHERE user_id = ? AND video_id IN ({placeholders})",
+            (user_id, *ids),
+        ).fetchall()
+        return {r["video_id"] for r in rows}
 
     def search(self, filter_type: str, query: str, page: int):
         offset = page * PAGE_SIZE
         q = query.strip()
         if filter_type == "title":
-            base = "SELECT * FROM videos WHERE lower(title) LIKE ? ORDER BY id DESC"
-            arg = (f"%{q.lower()}%",)
-            total = self.conn.execute(f"SELECT COUNT(*) AS cnt FROM ({base})", arg).fetchone()["cnt"]
-            rows = self.conn.execute(f"{base} LIMIT ? OFFSET ?", (*arg, PAGE_SIZE, offset)).fetchall()
-            pages = ceil(total / PAGE_SIZE) if total else 0
-            return rows, pages
-
-        base = """
-            SELECT DISTINCT v.*
+            # Prefix-match every word through the FTS index; best matches first.
+            match = " ".join(f'"{t}"*' for t in re.findall(r"\w+", q))
+            if not match:
+                return [], 0
+            rows = self.conn.execute(
+                """
+                SELECT v.id, v.title, COUNT(*) OVER () AS total
+                  FROM videos_fts f
+                  JOIN videos v ON v.id = f.rowid
+                 WHERE videos_fts MATCH ?
+                 ORDER BY f.rank
+                 LIMIT ? OFFSET ?
+                """,
+                (match, PAGE_SIZE, offset),
+            ).fetchall()
+            return rows, ceil(rows[0]["total"] / PAGE_SIZE) if rows else 0
+
+        # category names are UNIQUE and (video_id, category_id) is the PK,
+        # so the join yields one row per video — no DISTINCT needed.
+        rows = self.conn.execute(
+            """
+            SELECT v.id, v.title, COUNT(*) OVER () AS total
               FROM videos v
               JOIN video_categories vc ON vc.video_id = v.id
               JOIN categories c ON c.id = vc.category_id
              WHERE lower(c.name) = lower(?)
              ORDER BY v.id DESC
-        """
-        total = self.conn.execute(f"SELECT COUNT(*) AS cnt FROM ({base})", (q,)).fetchone()["cnt"]
-        rows = self.conn.execute(f"{base} LIMIT ? OFFSET ?", (q, PAGE_SIZE, offset)).fetchall()
-        pages = ceil(total / PAGE_SIZE) if total else 0
-        return rows, pages
+             LIMIT ? OFFSET ?
+            """,
+            (q, PAGE_SIZE, offset),
+        ).fetchall()
+        return rows, ceil(rows[0]["total"] / PAGE_SIZE) if rows else 0
 
     def toggle_favorite(self, user_id: int, video_id: int) -> bool:
-        row = self.conn.execute(
-            "SELECT 1 FROM favorites WHERE user_id = ? AND video_id = ?", (user_id, video_id)
-        ).fetchone()
-        if row:
+        # One write instead of SELECT-then-write: the IGNORE tells us whether
+        # the pair already existed, so there is no race between check and write.
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO favorites(user_id, video_id) VALUES(?, ?)", (user_id, video_id)
+        )
+        flag = cur.rowcount > 0
+        if not flag:
             self.conn.execute("DELETE FROM favorites WHERE user_id = ? AND video_id = ?", (user_id, video_id))
-            self.conn.commit()
-            return False
-        self.conn.execute("INSERT INTO favorites(user_id, video_id) VALUES(?, ?)", (user_id, video_id))
         self.conn.commit()
-        return True
+        self._fav_cache[(user_id, video_id)] = (time.monotonic(), flag)
+        return flag
 
     def is_favorite(self, user_id: int, video_id: int) -> bool:
-        return (
+        key = (user_id, video_id)
+        cached = self._fav_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < FAV_CACHE_TTL:
+            return cached[1]
+        flag = (
             self.conn.execute(
                 "SELECT 1 FROM favorites WHERE user_id = ? AND video_id = ?", (user_id, video_id)
             ).fetchone()
             is not None
         )
+        if len(self._fav_cache) >= FAV_CACHE_MAX:
+            self._fav_cache.clear()
+        self._fav_cache[key] = (time.monotonic(), flag)
+        return flag
 
     def favorites(self, user_id: int, page: int):
         offset = page * PAGE_SIZE
-        total = self.conn.execute(
-            "SELECT COUNT(*) AS cnt FROM favorites WHERE user_id = ?", (user_id,)
-        ).fetchone()["cnt"]
         rows = self.conn.execute(
             """
-            SELECT v.* FROM videos v
+            SELECT v.id, v.title, COUNT(*) OVER () AS total FROM videos v
             JOIN favorites f ON f.video_id = v.id
             WHERE f.user_id = ?
             ORDER BY v.id DESC
@@ -535,29 +800,30 @@ class Storage:
             """,
             (user_id, PAGE_SIZE, offset),
         ).fetchall()
-        return rows, ceil(total / PAGE_SIZE) if total else 0
+        return rows, ceil(rows[0]["total"] / PAGE_SIZE) if rows else 0
 
     def list_all_videos(self, page: int):
         offset = page * PAGE_SIZE
-        total = self.conn.execute("SELECT COUNT(*) AS cnt FROM videos").fetchone()["cnt"]
         rows = self.conn.execute(
-            "SELECT * FROM videos ORDER BY id DESC LIMIT ? OFFSET ?", (PAGE_SIZE, offset)
+            "SELECT id, title, COUNT(*) OVER () AS total FROM videos ORDER BY id DESC LIMIT ? OFFSET ?",
+            (PAGE_SIZE, offset),
         ).fetchall()
-        return rows, ceil(total / PAGE_SIZE) if total else 0
+        return rows, ceil(rows[0]["total"] / PAGE_SIZE) if rows else 0
 
     def list_titles(self, page: int):
         offset = page * TITLE_LIST_PAGE_SIZE
-        total = self.conn.execute("SELECT COUNT(*) AS cnt FROM videos").fetchone()["cnt"]
         rows = self.conn.execute(
-            "SELECT id, title FROM videos ORDER BY id DESC LIMIT ? OFFSET ?",
+            "SELECT id, title, COUNT(*) OVER () AS total FROM videos ORDER BY id DESC LIMIT ? OFFSET ?",
             (TITLE_LIST_PAGE_SIZE, offset),
         ).fetchall()
-        return rows, ceil(total / TITLE_LIST_PAGE_SIZE) if total else 0
+        return rows, ceil(rows[0]["total"] / TITLE_LIST_PAGE_SIZE) if rows else 0
 
     def update_title(self, video_id: int, title: str) -> None:
         self.conn.execute("UPDATE videos SET title = ? WHERE id = ?", (title.strip(), video_id))
         self.conn.commit()
+        self._invalidate_video(video_id)
 
     def delete_video(self, video_id: int) -> None:
         self.conn.execute("DELETE FROM videos WHERE id = ?", (video_id,))
         self.conn.commit()
+        self._invalidate_video(video_id)
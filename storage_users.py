@@ -10,6 +10,10 @@ from dataclasses import dataclass
 
 SECONDS_IN_DAY = 86_400
 LIST_PAGE_SIZE = 20
+# Role guards hit get_user on every update; a short TTL absorbs button
+# spam while keeping ban/expiry changes visible within half a minute.
+USER_CACHE_TTL = 30.0
+USER_CACHE_MAX = 4096
 
 
 @dataclass(slots=True)
@@ -29,10 +33,28 @@ class UsersStorage:
 
     def __init__(self, path: str | None = None) -> None:
         self.path = path or os.getenv("DB_PATH", "/app/data/dancehall.db")
-        self.conn = sqlite3.connect(self.path)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
         self.conn.row_factory = sqlite3.Row
+        # telegram_id -> (fetch time, row or None); writes invalidate.
+        self._user_cache: dict[int, tuple[float, sqlite3.Row | None]] = {}
+        self._apply_pragmas()
         self._init_db()
 
+    def _apply_pragmas(self) -> None:
+        # WAL lets admin list reads proceed while writes are in flight;
+        # synchronous=NORMAL halves fsyncs per write (safe with WAL).
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA cache_size=-20000")
+
+    def close(self) -> None:
+        # Refresh planner statistics on the way out; see Storage.close().
+        self.conn.execute("PRAGMA analysis_limit=1000")
+        self.conn.execute("PRAGMA optimize")
+        self.conn.close()
+
     def _init_db(self) -> None:
         self.conn.executescript(
             """
@@ -48,12 +70,26 @@ class UsersStorage:
             );
             CREATE INDEX IF NOT EXISTS idx_users_expires_at ON users(expires_at);
             CREATE INDEX IF NOT EXISTS idx_users_is_banned ON users(is_banned);
+            CREATE INDEX IF NOT EXISTS idx_users_active
+              ON users(is_banned, expires_at) WHERE is_banned = 0;
+            CREATE INDEX IF NOT EXISTS idx_users_expiring
+              ON users(expires_at) WHERE is_banned = 0 AND expires_at IS NOT NULL;
             """
         )
         self.conn.commit()
 
     def get_user(self, telegram_id: int):
-        return self.conn.execute("SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone()
+        cached = self._user_cache.get(telegram_id)
+        if cached is not None and time.monotonic() - cached[0] < USER_CACHE_TTL:
+            return cached[1]
+        row = self.conn.execute("SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone()
+        if len(self._user_cache) >= USER_CACHE_MAX:
+            self._user_cache.clear()
+        self._user_cache[telegram_id] = (time.monotonic(), row)
+        return row
+
+    def _invalidate_user(self, telegram_id: int) -> None:
+        self._user_cache.pop(telegram_id, None)
 
     def get_user_by_username(self, username: str):
         normalized = username.strip().lstrip("@").lower()
@@ -89,6 +125,72 @@ class UsersStorage:
             (telegram_id, username, full_name, expires_at, is_banned, note, ts, ts),
         )
         self.conn.commit()
+        self._invalidate_user(telegram_id)
+
+    def upsert_expiration(
+        self,
+        telegram_id: int,
+        username: str | None,
+        full_name: str | None,
+        expires_at: int | None,
+    ) -> None:
+        """Set expiration in one statement, inserting the user if missing."""
+        ts = int(time.time())
+        self.conn.execute(
+            """
+            INSERT INTO users(telegram_id, username, full_name, expires_at, is_banned, created_at, updated_at)
+            VALUES(?, ?, ?, ?, 0, ?, ?)
+            ON CONFLICT(telegram_id) DO UPDATE SET
+                expires_at = excluded.expires_at,
+                updated_at = excluded.updated_at
+            """,
+            (telegram_id, username, full_name, expires_at, ts, ts),
+        )
+        self.conn.commit()
+        self._invalidate_user(telegram_id)
+
+    def extend_expiration(
+        self,
+        telegram_id: int,
+        username: str | None,
+        full_name: str | None,
+        delta: int,
+        now: int,
+    ) -> int:
+        """Extend from the current expiration (or from now when absent/expired) in one upsert."""
+        ts = int(time.time())
+        row = self.conn.execute(
+            """
+            INSERT INTO users(telegram_id, username, full_name, expires_at, is_banned, created_at, updated_at)
+            VALUES(?, ?, ?, ?, 0, ?, ?)
+            ON CONFLICT(telegram_id) DO UPDATE SET
+                expires_at = MAX(COALESCE(users.expires_at, 0), ?) + ?,
+                updated_at = excluded.updated_at
+            RETURNING expires_at
+            """,
+            (telegram_id, username, full_name, now + delta, ts, ts, now, delta),
+        ).fetchone()
+        self.conn.commit()
+        self._invalidate_user(telegram_id)
+        return int(row["expires_at"])
+
+    def toggle_ban(self, telegram_id: int, username: str | None, full_name: str | None) -> bool:
+        """Flip the ban flag in one upsert (new users start banned) and return the new state."""
+        ts = int(time.time())
+        row = self.conn.execute(
+            """
+            INSERT INTO users(telegram_id, username, full_name, expires_at, is_banned, created_at, updated_at)
+            VALUES(?, ?, ?, NULL, 1, ?, ?)
+            ON CONFLICT(telegram_id) DO UPDATE SET
+                is_banned = 1 - users.is_banned,
+                updated_at = excluded.updated_at
+            RETURNING is_banned
+            """,
+            (telegram_id, username, full_name, ts, ts),
+        ).fetchone()
+        self.conn.commit()
+        self._invalidate_user(telegram_id)
+        return bool(row["is_banned"])
 
     def update_expiration(self, telegram_id: int, expires_at: int | None) -> None:
         self.conn.execute(
@@ -96,6 +198,7 @@ class UsersStorage:
             (expires_at, int(time.time()), telegram_id),
         )
         self.conn.commit()
+        self._invalidate_user(telegram_id)
 
     def set_ban(self, telegram_id: int, is_banned: bool) -> None:
         self.conn.execute(
@@ -103,10 +206,12 @@ class UsersStorage:
             (1 if is_banned else 0, int(time.time()), telegram_id),
         )
         self.conn.commit()
+        self._invalidate_user(telegram_id)
 
     def delete_user(self, telegram_id: int) -> None:
         self.conn.execute("DELETE FROM users WHERE telegram_id = ?", (telegram_id,))
         self.conn.commit()
+        self._invalidate_user(telegram_id)
 
     def list_active(self, now: int, offset: int):
         return self.conn.execute(
@@ -134,6 +239,24 @@ class UsersStorage:
         ).fetchone()
         return int(row["cnt"])
 
+    def list_active_with_count(self, now: int, offset: int) -> tuple[int, list[sqlite3.Row]]:
+        """One round-trip page fetch: rows plus total via COUNT(*) OVER()."""
+        rows = self.conn.execute(
+            """
+            SELECT *, COUNT(*) OVER () AS total
+            FROM users
+            WHERE is_banned = 0
+              AND expires_at IS NOT NULL
+              AND expires_at > ?
+            ORDER BY expires_at ASC
+            LIMIT ? OFFSET ?
+            """,
+            (now, LIST_PAGE_SIZE, offset),
+        ).fetchall()
+        if rows:
+            return int(rows[0]["total"]), rows
+        return self.count_active(now), rows
+
     def list_expiring(self, now: int, until: int, offset: int):
         return self.conn.execute(
             """
@@ -146,6 +269,23 @@ class UsersStorage:
             (now, until, LIST_PAGE_SIZE, offset),
         ).fetchall()
 
+    def list_expiring_with_count(self, now: int, until: int, offset: int) -> tuple[int, list[sqlite3.Row]]:
+        """One round-trip page fetch: rows plus total via COUNT(*) OVER()."""
+        rows = self.conn.execute(
+            """
+            SELECT *, COUNT(*) OVER () AS total
+            FROM users
+            WHERE is_banned = 0
+              AND expires_at BETWEEN ? AND ?
+            ORDER BY expires_at ASC
+            LIMIT ? OFFSET ?
+            """,
+            (now, until, LIST_PAGE_SIZE, offset),
+        ).fetchall()
+        if rows:
+            return int(rows[0]["total"]), rows
+        return self.count_expiring(now, until), rows
+
     def count_expiring(self, now: int, until: int) -> int:
         row = self.conn.execute(
             """
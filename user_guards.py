@@ -14,7 +14,11 @@ from storage_users import UsersStorage
 DENIED_MEMBER_TEXT = "Обратитесь к администратору @deeear_polly"
 
 
-def resolve_role(user_id: int | None, admin_ids: set[int], users_storage: UsersStorage) -> UserRole:
+def is_admin(user_id: int | None, admin_ids: frozenset[int]) -> bool:
+    return user_id is not None and user_id in admin_ids
+
+
+def resolve_role(user_id: int | None, admin_ids: frozenset[int], users_storage: UsersStorage) -> UserRole:
     if user_id is None:
         return UserRole.UNKNOWN
     if user_id in admin_ids:
@@ -35,12 +39,12 @@ def require_admin(handler: Callable[..., Awaitable[None]]):
 
     @wraps(handler)
     async def wrapper(event, *args, **kwargs):
-        admin_ids: set[int] = kwargs["admin_ids"]
-        users_storage: UsersStorage = kwargs["users_storage"]
+        admin_ids: frozenset[int] = kwargs["admin_ids"]
         state: FSMContext | None = kwargs.get("state")
         from_user = getattr(event, "from_user", None)
-        role = resolve_role(from_user.id if from_user else None, admin_ids, users_storage)
-        if role is not UserRole.ADMIN:
+        # Membership alone decides; non-admins are rejected whatever their
+        # role, so there is no reason to classify them against the database.
+        if not is_admin(from_user.id if from_user else None, admin_ids):
             if state:
                 await state.clear()
             if isinstance(event, Message):
@@ -58,7 +62,7 @@ def require_member(handler: Callable[..., Awaitable[None]]):
 
     @wraps(handler)
     async def wrapper(event, *args, **kwargs):
-        admin_ids: set[int] = kwargs["admin_ids"]
+        admin_ids: frozenset[int] = kwargs["admin_ids"]
         users_storage: UsersStorage = kwargs["users_storage"]
         state: FSMContext | None = kwargs.get("state")
         from_user = getattr(event, "from_user", None)